@@ -1,15 +1,123 @@
+import os
 import streamlit as st
-from engine.data_loader import load_data_from_investment
-from engine.rule_engine import load_rules, load_investments
-from main import check_breached_covenant
+from engine.data_loader import load_data_from_investment, source_fingerprint
+from engine.rule_engine import (
+    INVESTMENTS_PATH,
+    load_rules,
+    load_rule_set,
+    load_investments,
+    RuleConfigError,
+)
+from engine.history_store import (
+    list_runs,
+    count_runs,
+    load_run_investments,
+    list_metrics,
+    query_series,
+    store_version,
+)
+from engine.background import get_runner
 import pandas as pd
 
 st.set_page_config(page_title="Covenant Breach Detection Agent", layout="wide")
 
-rules = load_rules()
-investments = load_investments()
+# Dashboard result cache lifetime, chart downsampling and run polling
+DASHBOARD_CACHE_TTL_SECONDS = int(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "300"))
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "500"))
+RUN_POLL_SECONDS = float(os.getenv("RUN_POLL_SECONDS", "1"))
+
+CHART_METRICS = [
+    "Debt-to-EBITDA","Debt-to-Equity","Net-Debt-to-Total-Cap",
+    "Senior-Debt-to-EBITDA","Interest-Coverage","DSCR",
+    "Fixed-Charge-Coverage","Current-Ratio","Quick-Ratio",
+    "Cash-Balance-MM","EBITDA-MM","EBITDA-Margin","ROA","ROE"
+]
+
+# ----------------------
+# CACHED DATA LAYER
+# ----------------------
+# Cached functions take a `version` (file mtimes) so a rerun only
+# recomputes what changed on disk; the TTL bounds memory and how stale
+# API-backed data (no mtime) can get. Cached across sessions, so
+# several analysts share one copy.
+
+def file_version(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+@st.cache_data(ttl=DASHBOARD_CACHE_TTL_SECONDS, show_spinner=False)
+def _cached_investments(version):
+    return load_investments()
+
+
+def get_investments():
+    return _cached_investments(file_version(INVESTMENTS_PATH))
+
+
+def downsample(df, column, max_points=CHART_MAX_POINTS):
+    """
+    At most ~max_points rows of df for charting. Keeps the min and max
+    of `column` in each bucket, so spikes (and breaches) stay visible,
+    plus the latest row.
+    """
+    if max_points <= 0 or len(df) <= max_points:
+        return df
+
+    values = df[column].reset_index(drop=True).dropna()
+    buckets = max(1, max_points // 2)
+    groups = values.groupby(values.index * buckets // len(df))
+    keep = set(groups.idxmin()) | set(groups.idxmax()) | {len(df) - 1}
+
+    return df.iloc[sorted(keep)]
+
+
+@st.cache_data(ttl=DASHBOARD_CACHE_TTL_SECONDS, show_spinner=False, max_entries=256)
+def _cached_chart_data(investment, metric, version, max_points):
+    # Only the charted columns are read (CSV/SQLite push this down)
+    data = load_data_from_investment(investment, columns=["Period", metric])
+    if metric not in data.columns:
+        return None
+    return downsample(data, metric, max_points)
+
+
+def get_chart_data(investment, metric):
+    version = source_fingerprint(investment.get("data_source", {}))
+    return _cached_chart_data(investment, metric, version, CHART_MAX_POINTS)
+
+
+@st.cache_data(ttl=DASHBOARD_CACHE_TTL_SECONDS, show_spinner=False)
+def _cached_run_count(version):
+    return count_runs()
+
+
+@st.cache_data(ttl=DASHBOARD_CACHE_TTL_SECONDS, show_spinner=False)
+def _cached_runs(version, limit, offset):
+    return list_runs(limit=limit, offset=offset)
+
+
+@st.cache_data(ttl=DASHBOARD_CACHE_TTL_SECONDS, show_spinner=False, max_entries=128)
+def _cached_run_investments(version, run_id, inv_id, severities, limit, offset):
+    return load_run_investments(
+        run_id, inv_id=inv_id, severities=list(severities), limit=limit, offset=offset
+    )
+
+
+@st.cache_data(ttl=DASHBOARD_CACHE_TTL_SECONDS, show_spinner=False, max_entries=128)
+def _cached_metrics(version, inv_id):
+    return list_metrics(inv_id)
+
+
+@st.cache_data(ttl=DASHBOARD_CACHE_TTL_SECONDS, show_spinner=False, max_entries=128)
+def _cached_series(version, inv_id, metric, last_n):
+    return pd.DataFrame(query_series(inv_id, metric, last_n=last_n))
+
 
 def investments_dashboard():
+    investments = get_investments()
     st.subheader("Investments Overview")
 
     col1, col2 = st.columns(2)
@@ -32,23 +140,17 @@ def investments_dashboard():
     # ----------------------
     # SELECT METRIC TO CHART
     # ----------------------
-    data = load_data_from_investment(investment)
-
     with col2:
-        selected_metric = st.selectbox(
-            "Select a factor to visualize:",
-            [
-                "Debt-to-EBITDA","Debt-to-Equity","Net-Debt-to-Total-Cap",
-                "Senior-Debt-to-EBITDA","Interest-Coverage","DSCR",
-                "Fixed-Charge-Coverage","Current-Ratio","Quick-Ratio",
-                "Cash-Balance-MM","EBITDA-MM","EBITDA-Margin","ROA","ROE"
-            ]
-        )
+        selected_metric = st.selectbox("Select a factor to visualize:", CHART_METRICS)
 
     # ----------------------
     # SHOW CHART 
     # ----------------------
-    st.line_chart(data, x="Period", y=selected_metric)
+    data = get_chart_data(investment, selected_metric)
+    if data is None:
+        st.info(f"{selected_metric} is not available for this investment.")
+    else:
+        st.line_chart(data, x="Period", y=selected_metric)
 
     # ----------------------
     # IMPROVED INVESTMENT INFO DISPLAY
@@ -129,7 +231,8 @@ def render_rule(rule):
     st.markdown(rule["description"])
 
 def config_rules_dashboard():
-    global rules
+    # Re-parsed only when rules.yaml changes
+    rules = load_rules()
     col1, col2 = st.columns(2)
 
     mid = len(rules) // 2
@@ -149,78 +252,106 @@ def config_rules_dashboard():
 def breach_detection_dashboard():
     st.title("Covenant Monitoring Report")
 
-    if st.button("Run Covenant Monitoring Pipeline"):
-        report = check_breached_covenant(investments, rules)
-        st.session_state["report"] = report
-
-    if "report" not in st.session_state:
+    # Runs happen on a background thread shared by all sessions; the
+    # page only polls it, so reruns and other analysts never block on it
+    runner = get_runner()
+    run = runner.current
+    running = run is not None and run.active
+
+    if st.button("Run Covenant Monitoring Pipeline", disabled=running):
+        try:
+            rule_set = load_rule_set()
+        except RuleConfigError as e:
+            st.error(str(e))
+            return
+
+        run, started = runner.submit(get_investments(), rule_set)
+        if not started:
+            st.info("A pipeline run is already in progress — showing it instead.")
+        st.session_state.pop("selected_investment", None)
+        running = True
+
+    if run is None:
         return
 
-    report = st.session_state["report"]
+    @st.fragment(run_every=RUN_POLL_SECONDS if running else None)
+    def run_view():
+        render_run_status(run)
+        if run.report is not None:
+            render_report(run.report, explanations_pending=run.active)
+        elif run.entries:
+            # Investments appear as their chunk is evaluated
+            render_partial_results(list(run.entries))
 
-    st.subheader("Portfolio Summary")
-    st.metric("Total Investments", report["summary"]["total_investments"])
-    st.metric("Total Breaches", report["summary"]["total_breaches"])
-    st.metric("Total Near Breaches", report["summary"]["total_near_breaches"])
-    st.metric("Total Ideal Ratios", report["summary"]["total_ideal"])
+        # Finished: one full rerun stops polling and re-enables the button
+        if running and not run.active:
+            st.rerun()
 
-    st.subheader("Investment-Level Results")
+    run_view()
 
-    # Build UI table
-    for inv in report["investments"]:
-        cols = st.columns([3,2,2,2,2])
-
-        cols[0].write(f"### {inv['name']}")
-        cols[1].metric("Breaches", inv["breaches"])
-        cols[2].metric("Near Breach", inv["near_breaches"])
-        cols[3].metric("Ideal", inv["ideal"])
-
-        if cols[4].button("View Details", key=f"btn_{inv['id']}"):
-            st.session_state["selected_investment"] = inv
-
-    # Popup modal
-    if "selected_investment" in st.session_state:
-        inv = st.session_state["selected_investment"]
-        st.markdown("---")
-        st.subheader(f"Detailed Covenant Data — {inv['name']}")
-
-        for alert in inv["alerts"]:
-            with st.expander(f"{alert['metric']} → {alert['severity'].upper()}"):
-                st.write("**Current Value:**", alert["current_value"])
-                st.write("**Limit:**", alert["limit"])
-                st.write("**Trend:**", alert["trend"])
-                st.write("**Rate of Change:**", alert["rate_of_change"])
-                st.write("**Confidence:**", alert["trend_confidence"])
-
-                # Render explanation if exists
-                if "explanation" in alert:
-                    st.markdown("### 📘 LLM Explanation")
-                    st.info(alert["explanation"])
+def render_run_status(run):
+    if run.status == "failed":
+        st.error(f"Pipeline run failed after {run.seconds()}s: {run.error}")
+        return
 
-                st.write("### Rule Evaluation Details")
-                st.json(alert["rule_result"])
-def breach_detection_dashboard():
-    st.title("Covenant Monitoring Report")
+    if run.status == "done":
+        st.success(f"Run {run.report.get('run_id')} finished in {run.seconds()}s")
+        return
 
-    if st.button("Run Covenant Monitoring Pipeline"):
-        report = check_breached_covenant(investments, rules)
-        st.session_state["report"] = report
+    if run.stage in ("starting", "prepare"):
+        done, total = run.progress.get("prepare", (0, 0))
+        st.progress(done / total if total else 0.0, text=f"Loading investments… {done}/{total}")
+    else:
+        done, total = run.progress.get("explain", (0, 0))
+        st.progress(done / total if total else 0.0, text=f"Generating explanations… {done}/{total}")
+
+def render_missing_columns(summary):
+    # Covenants that apply but couldn't be checked (e.g. renamed columns)
+    missing = summary.get("missing_columns", [])
+    if missing:
+        st.warning(
+            f"{len(missing)} covenant check(s) skipped: the data source lacks the metric's columns.\n\n"
+            + "\n".join(
+                f"- {m['name']} — {m['metric']}: missing {', '.join(m['columns'])}"
+                for m in missing
+            )
+        )
 
-    if "report" not in st.session_state:
-        return
+    # Covenants whose latest value is blank or not a number (e.g. '--')
+    unvalued = summary.get("missing_values", [])
+    if unvalued:
+        st.warning(
+            f"{len(unvalued)} covenant check(s) skipped: the latest value is missing or not a number.\n\n"
+            + "\n".join(f"- {m['name']} — {m['metric']}" for m in unvalued)
+        )
 
-    report = st.session_state["report"]
 
+def render_report(report, explanations_pending=False):
     st.subheader("Portfolio Summary")
     st.metric("Total Investments", report["summary"]["total_investments"])
     st.metric("Total Breaches", report["summary"]["total_breaches"])
     st.metric("Total Near Breaches", report["summary"]["total_near_breaches"])
     st.metric("Total Ideal Ratios", report["summary"]["total_ideal"])
 
+    render_missing_columns(report["summary"])
+
+    render_investment_results(report["investments"], explanations_pending)
+
+
+def render_partial_results(entries):
+    st.subheader("Results So Far")
+    st.caption(f"{len(entries)} investment(s) evaluated — totals update as the run continues")
+    st.metric("Breaches So Far", sum(e["breaches"] for e in entries))
+    st.metric("Near Breaches So Far", sum(e["near_breaches"] for e in entries))
+
+    render_investment_results(entries, explanations_pending=True)
+
+
+def render_investment_results(entries, explanations_pending=False):
     st.subheader("Investment-Level Results")
 
     # Build UI table
-    for inv in report["investments"]:
+    for inv in entries:
         cols = st.columns([3,2,2,2,2])
 
         cols[0].write(f"### {inv['name']}")
@@ -229,11 +360,12 @@ def breach_detection_dashboard():
         cols[3].metric("Ideal", inv["ideal"])
 
         if cols[4].button("View Details", key=f"btn_{inv['id']}"):
-            st.session_state["selected_investment"] = inv
+            st.session_state["selected_investment"] = inv["id"]
 
     # Popup modal
-    if "selected_investment" in st.session_state:
-        inv = st.session_state["selected_investment"]
+    selected = st.session_state.get("selected_investment")
+    inv = next((e for e in entries if e["id"] == selected), None)
+    if inv is not None:
         st.markdown("---")
         st.subheader(f"Detailed Covenant Data — {inv['name']}")
 
@@ -245,58 +377,127 @@ def breach_detection_dashboard():
                 st.write("**Rate of Change:**", alert["rate_of_change"])
                 st.write("**Confidence:**", alert["trend_confidence"])
 
-                # Render explanation if exists
+                # Render explanation if exists (filled in while the run finishes)
                 if "explanation" in alert:
                     st.markdown("### 📘 LLM Explanation")
                     st.info(alert["explanation"])
+                elif explanations_pending and alert["severity"] != "ok":
+                    st.caption("⏳ Explanation pending…")
 
                 st.write("### Rule Evaluation Details")
                 st.json(alert["rule_result"])
 
-import os
-import json
-HISTORY_DIR = "history"
-
-def load_history_files():
-    if not os.path.exists(HISTORY_DIR):
-        return []
-    return sorted(os.listdir(HISTORY_DIR), reverse=True)
-
-def load_report(path):
-    with open(path, "r") as f:
-        return json.load(f)
+RUNS_PER_PAGE = 50
+INVESTMENTS_PER_PAGE = 20
 
 def history_viewer():
     st.title("📜 Covenant Monitoring — History Viewer")
 
-    files = load_history_files()
+    # Query results are cached until the next run is written
+    version = store_version()
+    investments = get_investments()
+    total_runs = _cached_run_count(version)
 
-    if not files:
+    if not total_runs:
         st.info("No historical reports found.")
         return
 
-    selected = st.selectbox("Select a report:", files)
+    # Page through runs, newest first
+    run_pages = max(1, -(-total_runs // RUNS_PER_PAGE))
+    run_page = st.number_input("Runs page", min_value=1, max_value=run_pages, value=1)
+    runs = _cached_runs(version, RUNS_PER_PAGE, (run_page - 1) * RUNS_PER_PAGE)
+
+    selected = st.selectbox(
+        "Select a report:",
+        runs,
+        format_func=lambda run: f"{run['created_at']} (run {run['run_id']})"
+    )
 
     if selected:
-        report_path = os.path.join(HISTORY_DIR, selected)
-        report = load_report(report_path)
+        summary = selected["summary"]
 
-        st.success(f"Loaded report: {selected}")
-        # st.write(f"**Generated At:** {report['generated_at']}")
+        st.success(f"Loaded report: {selected['created_at']}")
 
         # Summary
         st.subheader("Portfolio Summary")
         colA, colB, colC, colD = st.columns(4)
-        colA.metric("Total Investments", report["summary"]["total_investments"])
-        colB.metric("Total Breaches", report["summary"]["total_breaches"])
-        colC.metric("Total Near Breaches", report["summary"]["total_near_breaches"])
-        colD.metric("Total Ideal", report["summary"]["total_ideal"])
+        colA.metric("Total Investments", summary["total_investments"])
+        colB.metric("Total Breaches", summary["total_breaches"])
+        colC.metric("Total Near Breaches", summary["total_near_breaches"])
+        colD.metric("Total Ideal", summary["total_ideal"])
+        render_missing_columns(summary)
 
         st.subheader("Investment-Level Results")
 
-        for inv in report["investments"]:
+        # Filters are applied in the store, not by parsing the whole report
+        filter_col1, filter_col2, filter_col3 = st.columns(3)
+        with filter_col1:
+            inv_option = st.selectbox(
+                "Investment:",
+                ["All"] + [f"{inv['id']} - {inv['name']}" for inv in investments]
+            )
+        with filter_col2:
+            severities = st.multiselect("Alert severity:", ["critical", "warning", "ok"])
+        with filter_col3:
+            inv_pages = max(1, -(-summary["total_investments"] // INVESTMENTS_PER_PAGE))
+            inv_page = st.number_input("Investments page", min_value=1, max_value=inv_pages, value=1)
+
+        inv_id = None if inv_option == "All" else inv_option.split(" - ")[0]
+
+        entries = _cached_run_investments(
+            version,
+            selected["run_id"],
+            inv_id,
+            tuple(severities),
+            INVESTMENTS_PER_PAGE,
+            (inv_page - 1) * INVESTMENTS_PER_PAGE
+        )
+
+        for inv in entries:
             with st.expander(f"{inv['name']} — Breaches: {inv['breaches']}"):
                 st.json(inv)
+
+    render_metric_history(version, investments)
+
+def render_metric_history(version, investments):
+    st.markdown("---")
+    st.subheader("📈 Metric History Across Runs")
+
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        option = st.selectbox(
+            "Investment:",
+            [f"{inv['id']} - {inv['name']}" for inv in investments],
+            key="series_investment"
+        )
+        inv_id = option.split(" - ")[0]
+
+    metrics = _cached_metrics(version, inv_id)
+    if not metrics:
+        st.info("No alerts recorded for this investment yet.")
+        return
+
+    with col2:
+        metric = st.selectbox("Metric:", metrics, key="series_metric")
+    with col3:
+        last_n = st.number_input("Last N runs:", min_value=2, max_value=10000, value=90)
+
+    series = _cached_series(version, inv_id, metric, last_n)
+    if series.empty:
+        st.info("No history for this metric.")
+        return
+
+    st.markdown("**Current value vs limit**")
+    st.line_chart(downsample(series, "current_value"), x="created_at", y=["current_value", "limit"])
+
+    st.markdown("**Severity (0 = ok, 1 = warning, 2 = critical)**")
+    st.line_chart(downsample(series, "severity_score"), x="created_at", y="severity_score")
+
+    st.dataframe(
+        series[["created_at", "severity", "current_value", "limit", "trend", "rate_of_change", "trend_confidence"]],
+        hide_index=True
+    )
  
 
 pg = st.navigation([investments_dashboard, config_rules_dashboard, breach_detection_dashboard,history_viewer],expanded=True)
@@ -0,0 +1,246 @@
+import os
+import json
+import sqlite3
+import argparse
+import yaml
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Metric names from rules.yaml first, then generic ones
+KNOWN_METRICS = [
+    ("Debt-to-EBITDA", "maximum", 2.5, 4.2, 4.5),
+    ("Interest-Coverage", "minimum", 4.5, 2.7, 2.5),
+    ("Senior-Debt-to-EBITDA", "maximum", 1.8, 3.3, 3.5),
+    ("DSCR", "minimum", 1.8, 1.25, 1.2),
+    ("Debt-to-Equity", "maximum", 1.0, 2.3, 2.5),
+    ("Current-Ratio", "minimum", 2.0, 1.25, 1.2),
+    ("Net-Debt-to-Total-Cap", "maximum", 0.35, 0.62, 0.65),
+    ("Quick-Ratio", "minimum", 1.5, 1.05, 1.0),
+    ("Fixed-Charge-Coverage", "minimum", 2.0, 1.55, 1.5),
+    ("Cash-Balance-MM", "minimum", 15.0, 5.5, 5.0),
+    ("EBITDA-Margin", "minimum", 0.25, 0.13, 0.12),
+    ("ROA", "minimum", 0.12, 0.055, 0.05),
+]
+
+INVESTMENT_TYPES = [
+    ("Senior Secured Loan", "Term Loan"),
+    ("Mezzanine Debt", "Subordinated Debt"),
+    ("Revolving Credit Facility", "Revolver"),
+    ("Project Finance Loan", "Project Finance"),
+    ("Corporate Bond", "Senior Unsecured Bond"),
+]
+
+INDUSTRIES = ["Technology", "Retail", "Manufacturing", "Energy", "Healthcare"]
+
+SQLITE_FILE = "portfolio.db"
+SQLITE_TABLE = "covenant_data"
+
+
+def make_rules(n_metrics: int) -> list:
+    """
+    n_metrics covenant rules shaped like config/rules.yaml.
+    """
+    rules = []
+    for j in range(n_metrics):
+        if j < len(KNOWN_METRICS):
+            metric, covenant_type, ideal, near, threshold = KNOWN_METRICS[j]
+        else:
+            # Alternate maximum / minimum covenants for the generic metrics
+            metric = f"Metric-{j + 1}"
+            if j % 2 == 0:
+                covenant_type, ideal, near, threshold = "maximum", 2.0, 3.6, 4.0
+            else:
+                covenant_type, ideal, near, threshold = "minimum", 4.0, 2.2, 2.0
+
+        rules.append({
+            "name": f"{metric} Covenant",
+            "metric": metric,
+            "ideal_value": ideal,
+            "threshold_value": threshold,
+            "near_breach_value": near,
+            "covenant_type": covenant_type,
+            "severity": "high" if j % 3 == 0 else "medium",
+            "description": f"Synthetic {covenant_type} covenant on {metric}.",
+        })
+
+    return rules
+
+
+def _final_value(rule: dict, state: int, u: float) -> float:
+    # state: 0 = ideal, 1 = near breach, 2 = breach
+    ideal, near, threshold = rule["ideal_value"], rule["near_breach_value"], rule["threshold_value"]
+
+    if rule["covenant_type"] == "maximum":
+        ranges = [(0.5 * ideal, ideal), (near, threshold), (threshold * 1.01, threshold * 1.3)]
+    else:
+        ranges = [(ideal, ideal * 1.5), (threshold, near), (threshold * 0.7, threshold * 0.99)]
+
+    low, high = ranges[state]
+    return low + u * (high - low)
+
+
+def _series(rules: list, n_periods: int, breach_rate: float, near_rate: float, rng) -> np.ndarray:
+    """
+    (n_periods x metrics) random walks ending in a sampled state.
+    """
+    states = rng.choice(3, size=len(rules), p=[1 - breach_rate - near_rate, near_rate, breach_rate])
+    last = np.array([
+        _final_value(rule, state, u)
+        for rule, state, u in zip(rules, states, rng.random(len(rules)))
+    ])
+
+    # Walk backwards from the final value with small relative steps
+    steps = rng.normal(0, 0.02, size=(n_periods - 1, len(rules)))
+    factors = np.vstack([np.ones(len(rules)), np.cumprod(1 + steps, axis=0)])
+    return (last * factors)[::-1]
+
+
+def _periods(n_periods: int) -> list:
+    return [f"{2000 + m // 12:04d}-{m % 12 + 1:02d}" for m in range(n_periods)]
+
+
+def _parse_mix(mix) -> dict:
+    if isinstance(mix, dict):
+        weights = mix
+    else:
+        weights = {}
+        for part in str(mix).split(","):
+            kind, _, weight = part.partition("=")
+            weights[kind.strip()] = float(weight or 1)
+
+    unknown = set(weights) - {"csv", "excel", "sqlite"}
+    if unknown:
+        raise ValueError(f"Unknown source type(s): {sorted(unknown)}")
+
+    total = sum(weights.values())
+    return {kind: weight / total for kind, weight in weights.items()}
+
+
+def generate_portfolio(
+    out_dir: str,
+    n_investments: int = 100,
+    n_metrics: int = 8,
+    n_periods: int = 36,
+    sources="csv=0.7,sqlite=0.25,excel=0.05",
+    breach_rate: float = 0.1,
+    near_rate: float = 0.1,
+    seed: int = 0
+):
+    """
+    Writes a synthetic portfolio in the repo's layout.
+
+    Parameters:
+    - out_dir: Target folder; gets config/investments.json,
+      config/rules.yaml and data/ (one CSV/Excel file per investment,
+      SQLite investments share one table filtered by investment_id)
+    - n_investments / n_metrics / n_periods: Portfolio size
+    - sources: Source type mix, 'csv=0.7,sqlite=0.25,excel=0.05' or a dict
+    - breach_rate / near_rate: Share of (investment, metric) pairs whose
+      latest value is in breach / near breach
+    - seed: Random seed, so sizes are reproducible between commits
+
+    Returns:
+    - (investments, rules)
+    """
+    rng = np.random.default_rng(seed)
+    out = Path(out_dir)
+    data_dir = out / "data"
+    config_dir = out / "config"
+    data_dir.mkdir(parents=True, exist_ok=True)
+    config_dir.mkdir(parents=True, exist_ok=True)
+
+    rules = make_rules(n_metrics)
+    metrics = [rule["metric"] for rule in rules]
+    periods = _periods(n_periods)
+
+    mix = _parse_mix(sources)
+    kinds = rng.choice(list(mix), size=n_investments, p=list(mix.values()))
+
+    sqlite_path = data_dir / SQLITE_FILE
+    if sqlite_path.exists():
+        sqlite_path.unlink()
+    sqlite_frames = []
+
+    investments = []
+    for i in range(n_investments):
+        inv_id = i + 1
+        inv_type, loan_type = INVESTMENT_TYPES[i % len(INVESTMENT_TYPES)]
+        df = pd.DataFrame(
+            _series(rules, n_periods, breach_rate, near_rate, rng).round(4),
+            columns=metrics
+        )
+        df.insert(0, "Period", periods)
+
+        kind = kinds[i]
+        if kind == "csv":
+            name = f"Investment_{inv_id}_Covenant_Data.csv"
+            df.to_csv(data_dir / name, index=False)
+            data_source = {"type": "csv", "path": name, "table": "", "url": ""}
+        elif kind == "excel":
+            name = f"Investment_{inv_id}_Covenant_Data.xlsx"
+            df.to_excel(data_dir / name, index=False)
+            data_source = {"type": "excel", "path": name, "table": "", "url": ""}
+        else:
+            df.insert(0, "investment_id", inv_id)
+            sqlite_frames.append(df)
+            data_source = {
+                "type": "sqlite",
+                "path": SQLITE_FILE,
+                "table": SQLITE_TABLE,
+                "url": "",
+                "order_by": "Period",
+                "filter": {"investment_id": inv_id},
+            }
+
+        investments.append({
+            "id": inv_id,
+            "name": f"Synthetic Borrower {inv_id}",
+            "type": inv_type,
+            "amount_invested": int(rng.integers(5, 100)) * 1_000_000,
+            "date_invested": "2020-01-15",
+            "current_value": int(rng.integers(5, 100)) * 1_000_000,
+            "investment_details": {
+                "industry": INDUSTRIES[i % len(INDUSTRIES)],
+                "loan_type": loan_type,
+            },
+            "data_source": data_source,
+        })
+
+    if sqlite_frames:
+        with sqlite3.connect(sqlite_path) as conn:
+            pd.concat(sqlite_frames).to_sql(SQLITE_TABLE, conn, index=False)
+            conn.execute(
+                f"CREATE INDEX idx_{SQLITE_TABLE}_inv ON {SQLITE_TABLE} (investment_id, Period)"
+            )
+        conn.close()
+
+    with open(config_dir / "investments.json", "w") as f:
+        json.dump({"investments": investments}, f, indent=2)
+    with open(config_dir / "rules.yaml", "w") as f:
+        yaml.safe_dump({"rules": rules}, f, sort_keys=False)
+
+    return investments, rules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic covenant portfolio")
+    parser.add_argument("out_dir")
+    parser.add_argument("--investments", type=int, default=100)
+    parser.add_argument("--metrics", type=int, default=8)
+    parser.add_argument("--periods", type=int, default=36)
+    parser.add_argument("--sources", default="csv=0.7,sqlite=0.25,excel=0.05")
+    parser.add_argument("--breach-rate", type=float, default=0.1)
+    parser.add_argument("--near-rate", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    investments, rules = generate_portfolio(
+        args.out_dir, args.investments, args.metrics, args.periods,
+        args.sources, args.breach_rate, args.near_rate, args.seed
+    )
+    print(f"Wrote {len(investments)} investments x {len(rules)} metrics to {os.path.abspath(args.out_dir)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+import tracemalloc
+from pathlib import Path
+from datetime import datetime
+
+# Run from the repo root: python -m benchmarks.run
+from benchmarks.generate import generate_portfolio
+from engine import data_loader, history_store, portfolio
+from main import check_breached_covenant
+
+RESULTS_DIR = "benchmarks/results"
+
+
+def stub_explanation(latency_ms: float = 0.0):
+    """
+    Stand-in for the LLM: optionally sleeps, returns a fixed text.
+    """
+    def explain(alert):
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+        return f"[stub] {alert['metric']} is {alert['severity']}"
+    return explain
+
+
+def parse_size(text: str) -> tuple:
+    """
+    'NxMxT' -> (investments, metrics, periods)
+    """
+    try:
+        n, m, t = (int(part) for part in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Size '{text}' must look like 1000x8x36") from None
+    return n, m, t
+
+
+def git_commit() -> dict:
+    def git(*args):
+        return subprocess.run(
+            ["git", *args], capture_output=True, text=True, check=True
+        ).stdout.strip()
+
+    try:
+        return {
+            "commit": git("rev-parse", "--short", "HEAD"),
+            "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        }
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": "unknown", "dirty": False}
+
+
+def _maxrss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak += resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(peak * scale / 1e6, 1)
+
+
+def bench_size(size: tuple, args, workdir: Path) -> dict:
+    n, m, t = size
+    folder = workdir / f"{n}x{m}x{t}"
+
+    start = time.perf_counter()
+    investments, rules = generate_portfolio(
+        folder, n, m, t, args.sources, args.breach_rate, args.near_rate, args.seed
+    )
+    generate_s = time.perf_counter() - start
+
+    # Point the pipeline at the synthetic portfolio, away from repo state
+    data_loader.default_folder = str(folder / "data") + "/"
+    data_loader.BINARY_CACHE_DIR = str(folder / "cache")
+    history_store.HISTORY_DB = str(folder / "history.db")
+    history_store.HISTORY_DIR = str(folder / "history")
+    data_loader.invalidate_source_cache()
+
+    explain_options = {
+        "explain_fn": stub_explanation(args.llm_latency_ms),
+        "use_cache": False,
+        "rate_per_sec": 0,
+    }
+
+    def run():
+        start = time.perf_counter()
+        report = check_breached_covenant(
+            investments, rules, workers=args.workers, explain_options=explain_options
+        )
+        return time.perf_counter() - start, report
+
+    # One pool for the cold and warm runs, as the scheduler keeps its
+    # workers (and their source caches) alive between runs
+    with portfolio.warm_pool(args.workers):
+        # Cold: nothing parsed yet, worker processes not started
+        cold_s, _ = run()
+
+        # Warm: source caches populated, in this process and in the workers
+        warm = [run() for _ in range(args.repeat)]
+
+    warm_times = [seconds for seconds, _ in warm]
+    median_s = statistics.median(warm_times)
+    median_report = min(warm, key=lambda run_result: abs(run_result[0] - median_s))[1]
+
+    # Memory: a separate cold run under tracemalloc (slower, so untimed)
+    data_loader.invalidate_source_cache()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    summary = median_report["summary"]
+    return {
+        "size": f"{n}x{m}x{t}",
+        "investments": n,
+        "metrics": m,
+        "periods": t,
+        "generate_s": round(generate_s, 3),
+        "cold_s": round(cold_s, 4),
+        "warm_s": round(median_s, 4),
+        "warm_runs_s": [round(s, 4) for s in warm_times],
+        "investments_per_s": round(n / median_s, 1),
+        "rule_checks_per_s": round(summary["metrics"]["counters"].get("rule_checks", 0) / median_s, 1),
+        "peak_traced_mb": round(peak / 1e6, 1),
+        "max_rss_mb": _maxrss_mb(),
+        "stages_ms": summary["metrics"]["stages_ms"],
+        "breaches": summary["total_breaches"],
+        "near_breaches": summary["total_near_breaches"],
+    }
+
+
+def run_benchmarks(args) -> dict:
+    results = {
+        **git_commit(),
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "workers": args.workers,
+            "repeat": args.repeat,
+            "sources": args.sources,
+            "breach_rate": args.breach_rate,
+            "near_rate": args.near_rate,
+            "llm_latency_ms": args.llm_latency_ms,
+            "seed": args.seed,
+        },
+        "sizes": [],
+    }
+
+    workdir = Path(tempfile.mkdtemp(prefix="covenant-bench-"))
+    try:
+        for size in args.sizes:
+            result = bench_size(size, args, workdir)
+            results["sizes"].append(result)
+            print(
+                f"{result['size']:>14}  cold {result['cold_s']:.3f}s  warm {result['warm_s']:.3f}s"
+                f"  {result['investments_per_s']:>9.1f} inv/s  peak {result['peak_traced_mb']} MB"
+            )
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+        else:
+            print(f"Kept generated portfolios in {workdir}")
+
+    return results
+
+
+def save_results(results: dict, out_dir: str = RESULTS_DIR) -> str:
+    """
+    Writes results to <out_dir>/<commit>[-dirty].json.
+    """
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    name = results["commit"] + ("-dirty" if results["dirty"] else "")
+    path = Path(out_dir) / f"{name}.json"
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    return str(path)
+
+
+def compare(baseline_path: str, candidate_path: str, threshold: float = 0.10) -> bool:
+    """
+    Prints warm/cold time and peak memory changes per size between two
+    result files. Returns False if any warm time regressed by more than
+    `threshold` (0.10 = 10%).
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    if baseline.get("settings") != candidate.get("settings"):
+        print("Warning: benchmark settings differ between the two runs")
+
+    base_sizes = {entry["size"]: entry for entry in baseline["sizes"]}
+    print(f"{'size':>14}  {'metric':>14}  {baseline['commit']:>10}  {candidate['commit']:>10}  change")
+
+    ok = True
+    for entry in candidate["sizes"]:
+        base = base_sizes.get(entry["size"])
+        if base is None:
+            continue
+
+        for key in ("cold_s", "warm_s", "peak_traced_mb"):
+            before, after = base[key], entry[key]
+            change = (after - before) / before if before else 0.0
+            flag = ""
+            if key == "warm_s" and change > threshold:
+                flag = "  REGRESSION"
+                ok = False
+            print(f"{entry['size']:>14}  {key:>14}  {before:>10}  {after:>10}  {change:+.1%}{flag}")
+
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Covenant pipeline benchmarks")
+    sub = parser.add_subparsers(dest="command")
+
+    run_parser = sub.add_parser("run", help="Run benchmarks (default)")
+    run_parser.add_argument("--sizes", nargs="+", type=parse_size,
+                            default=[parse_size("100x8x36"), parse_size("1000x8x36")],
+                            help="Portfolio sizes as INVESTMENTSxMETRICSxPERIODS")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--workers", type=int, default=1)
+    run_parser.add_argument("--sources", default="csv=0.7,sqlite=0.25,excel=0.05")
+    run_parser.add_argument("--breach-rate", type=float, default=0.1)
+    run_parser.add_argument("--near-rate", type=float, default=0.1)
+    run_parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--out", default=RESULTS_DIR)
+    run_parser.add_argument("--keep", action="store_true", help="Keep generated portfolios")
+
+    compare_parser = sub.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.10)
+
+    argv = sys.argv[1:]
+    if not argv or argv[0] not in ("run", "compare", "-h", "--help"):
+        argv = ["run"] + argv
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        sys.exit(0 if compare(args.baseline, args.candidate, args.threshold) else 1)
+
+    results = run_benchmarks(args)
+    print(f"Saved {save_results(results, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
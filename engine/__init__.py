@@ -0,0 +1,5 @@
+from dotenv import load_dotenv
+
+# Engine modules read their settings with os.getenv at import time, so
+# .env is loaded once here, before any of them
+load_dotenv()
@@ -14,7 +14,8 @@ from engine.trend_analyser import analyze_trend
 def generate_alert(
     rule_result: dict,
     df,
-    metric: str
+    metric: str,
+    trend_info: dict = None
 ) -> dict:
     """
     Generates a structured alert by combining:
@@ -26,6 +27,7 @@ def generate_alert(
     - rule_result: Output from rule_engine (evaluation, near, limit, current_value)
     - df: Full metrics DataFrame
     - metric: Metric column name (e.g. 'debt_ratio')
+    - trend_info: Precomputed analyze_trend result (computed if omitted)
 
     Returns:
     - Alert dictionary
@@ -43,7 +45,8 @@ def generate_alert(
         severity = "critical"
 
     # 2. Run trend analysis
-    trend_info = analyze_trend(df, metric)
+    if trend_info is None:
+        trend_info = analyze_trend(df, metric)
 
     # 3. Build alert object
     alert = {
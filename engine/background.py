@@ -0,0 +1,117 @@
+import itertools
+import threading
+import traceback
+from datetime import datetime
+
+
+class BackgroundRun:
+    """
+    State of one pipeline run, updated by its worker thread as the
+    pipeline reports progress (see check_breached_covenant's progress).
+
+    - status: 'running', 'done' or 'failed'
+    - stage: last reported stage ('starting', 'prepare', 'results', 'explain')
+    - progress: {stage: (done, total)}
+    - entries: report entries evaluated so far, appended chunk by chunk
+      while investments load (carried-forward ones first)
+    - report: set at the 'results' stage; explanations are filled into
+      its alerts afterwards, so readers see them appear
+    """
+
+    def __init__(self, run_number: int):
+        self.number = run_number
+        self.status = "running"
+        self.stage = "starting"
+        self.progress = {}
+        self.entries = []
+        self.report = None
+        self.error = None
+        self.started_at = datetime.now()
+        self.finished_at = None
+        self.finished = threading.Event()
+
+    @property
+    def active(self) -> bool:
+        return not self.finished.is_set()
+
+    def seconds(self) -> float:
+        end = self.finished_at or datetime.now()
+        return round((end - self.started_at).total_seconds(), 1)
+
+    def update(self, stage: str, info: dict):
+        self.stage = stage
+        if "entries" in info:
+            self.entries += info["entries"]
+        if "report" in info:
+            self.report = info["report"]
+        if "total" in info:
+            self.progress[stage] = (info["done"], info["total"])
+
+    def wait(self, timeout: float = None) -> bool:
+        return self.finished.wait(timeout)
+
+
+class PipelineRunner:
+    """
+    Runs the pipeline on a background thread, one run at a time.
+
+    submit() returns immediately; while a run is active, further
+    submissions return the active run instead of starting a duplicate.
+    The latest run stays available as `current` after it finishes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = None
+        self._numbers = itertools.count(1)
+
+    def submit(self, investments: list, rules, **options):
+        """
+        Starts a run with check_breached_covenant(investments, rules,
+        **options) unless one is already active.
+
+        Returns:
+        - (run, started): the BackgroundRun to follow, and whether it
+          was started by this call
+        """
+        with self.lock:
+            if self.current is not None and self.current.active:
+                return self.current, False
+
+            run = BackgroundRun(next(self._numbers))
+            self.current = run
+
+        thread = threading.Thread(
+            target=self._run,
+            args=(run, investments, rules, options),
+            name=f"pipeline-run-{run.number}",
+            daemon=True
+        )
+        thread.start()
+        return run, True
+
+    def _run(self, run: BackgroundRun, investments: list, rules, options: dict):
+        # Imported here so importing the runner doesn't pull in the LLM client
+        from main import check_breached_covenant
+
+        try:
+            run.report = check_breached_covenant(
+                investments, rules, progress=run.update, **options
+            )
+            run.status = "done"
+        except Exception as e:
+            run.error = str(e)
+            run.status = "failed"
+            print(f"Background pipeline run failed: {e}")
+            traceback.print_exc()
+        finally:
+            run.finished_at = datetime.now()
+            run.finished.set()
+
+
+# One runner per process, shared by every dashboard session
+_runner = PipelineRunner()
+
+
+def get_runner() -> PipelineRunner:
+    return _runner
@@ -0,0 +1,137 @@
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+
+# Cached explanations expire after the TTL; oldest are evicted past max entries
+EXPLANATION_CACHE_PATH = os.getenv("EXPLANATION_CACHE_PATH", "cache/explanations.db")
+EXPLANATION_CACHE_TTL_HOURS = float(os.getenv("EXPLANATION_CACHE_TTL_HOURS", "168"))
+EXPLANATION_CACHE_MAX_ENTRIES = int(os.getenv("EXPLANATION_CACHE_MAX_ENTRIES", "5000"))
+
+
+def cache_key(model: str, system_prompt: str, prompt: str) -> str:
+    """
+    Content address of an explanation request: identical rendered prompts
+    sent to the same model share one cached explanation.
+    """
+    payload = json.dumps([model, system_prompt, prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ExplanationCache:
+    """
+    Persistent SQLite cache of LLM explanations with TTL expiry and
+    least-recently-used eviction once max_entries is exceeded.
+    """
+
+    def __init__(
+        self,
+        path: str = EXPLANATION_CACHE_PATH,
+        ttl_hours: float = EXPLANATION_CACHE_TTL_HOURS,
+        max_entries: int = EXPLANATION_CACHE_MAX_ENTRIES
+    ):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS explanations ("
+            " key TEXT PRIMARY KEY,"
+            " explanation TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_explanations_last_used"
+            " ON explanations (last_used)"
+        )
+        self.conn.commit()
+
+    def get(self, key: str):
+        """
+        Returns the cached explanation or None on a miss / expired entry.
+        """
+        now = time.time()
+
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT explanation, created_at FROM explanations WHERE key = ?",
+                (key,)
+            ).fetchone()
+
+            if row and now - row[1] <= self.ttl_seconds:
+                self.conn.execute(
+                    "UPDATE explanations SET last_used = ? WHERE key = ?",
+                    (now, key)
+                )
+                self.conn.commit()
+                self.hits += 1
+                return row[0]
+
+            if row:
+                self.conn.execute("DELETE FROM explanations WHERE key = ?", (key,))
+                self.conn.commit()
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, explanation: str):
+        now = time.time()
+
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO explanations VALUES (?, ?, ?, ?)",
+                (key, explanation, now, now)
+            )
+            self._evict(now)
+            self.conn.commit()
+
+    def _evict(self, now: float):
+        # Drop expired entries, then least recently used beyond the cap
+        self.conn.execute(
+            "DELETE FROM explanations WHERE created_at < ?",
+            (now - self.ttl_seconds,)
+        )
+        self.conn.execute(
+            "DELETE FROM explanations WHERE key IN ("
+            " SELECT key FROM explanations ORDER BY last_used DESC"
+            " LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM explanations")
+            self.conn.commit()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_explanation_cache() -> ExplanationCache:
+    """
+    Returns the process-wide explanation cache, opening it on first use.
+    """
+    global _default_cache
+
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ExplanationCache()
+
+    return _default_cache
@@ -0,0 +1,395 @@
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from engine.llm_explainer import (
+    OPENROUTER_MODEL,
+    SYSTEM_PROMPT,
+    build_prompt,
+    check_api_key,
+    request_explanation,
+    request_batch_explanation,
+    fallback_explanation,
+    BatchResponseError,
+)
+from engine.explanation_cache import cache_key, get_explanation_cache
+
+# Parallel LLM calls, token-bucket rate/burst and retry backoff on 429s
+EXPLAIN_CONCURRENCY = int(os.getenv("EXPLAIN_CONCURRENCY", "4"))
+EXPLAIN_RATE_PER_SEC = float(os.getenv("EXPLAIN_RATE_PER_SEC", "2"))
+EXPLAIN_BURST = int(os.getenv("EXPLAIN_BURST", "4"))
+EXPLAIN_MAX_RETRIES = int(os.getenv("EXPLAIN_MAX_RETRIES", "4"))
+EXPLAIN_BACKOFF_SECONDS = float(os.getenv("EXPLAIN_BACKOFF_SECONDS", "1.0"))
+# Stop starting LLM calls after this many seconds (0 = no limit)
+EXPLAIN_TIME_BUDGET_SECONDS = float(os.getenv("EXPLAIN_TIME_BUDGET_SECONDS", "0"))
+# Up to this many alerts of one investment share a request (1 = off)
+EXPLAIN_BATCH_SIZE = int(os.getenv("EXPLAIN_BATCH_SIZE", "1"))
+
+# Explained first when calls are rate limited or time budgeted
+SEVERITY_PRIORITY = {"critical": 0, "warning": 1}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: allows `burst` calls at once and refills
+    at `rate` tokens per second. A rate <= 0 disables limiting.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    # openai.RateLimitError and other APIStatusErrors carry status_code
+    return getattr(error, "status_code", None) == 429
+
+
+def _retry_after(error: Exception):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _call_with_retries(fn, bucket: TokenBucket, max_retries: int):
+    """
+    Calls fn() under the rate limit, retrying with exponential backoff
+    on 429 responses.
+
+    Returns:
+    - (value, error, latency of the last attempt, attempts); error is
+      None on success
+    """
+    attempts = 0
+
+    while True:
+        attempts += 1
+        bucket.acquire()
+        start = time.perf_counter()
+
+        try:
+            value = fn()
+            return value, None, time.perf_counter() - start, attempts
+
+        except Exception as e:
+            latency = time.perf_counter() - start
+
+            if _is_rate_limited(e) and attempts <= max_retries:
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = EXPLAIN_BACKOFF_SECONDS * (2 ** (attempts - 1))
+                    delay += random.uniform(0, EXPLAIN_BACKOFF_SECONDS)
+                time.sleep(delay)
+                continue
+
+            return None, e, latency, attempts
+
+
+def _explain_one(alert: dict, bucket: TokenBucket, max_retries: int, explain_fn) -> dict:
+    """
+    Explains a single alert in place, falling back to a templated text
+    when the call fails. Returns per-call stats.
+    """
+    explanation, error, latency, attempts = _call_with_retries(
+        lambda: explain_fn(alert), bucket, max_retries
+    )
+
+    if error is not None:
+        print(f"Error calling OpenRouter API: {error}")
+        explanation = fallback_explanation(alert)
+
+    alert["explanation"] = explanation
+    alert["explanation_latency_ms"] = round(latency * 1000, 1)
+    alert["explanation_attempts"] = attempts
+
+    return {"latency": latency, "attempts": attempts, "ok": error is None, "alert": alert}
+
+
+def _explain_batch(alerts: list, bucket: TokenBucket, max_retries: int, explain_fn, batch_fn) -> list:
+    """
+    Explains several alerts with one batch_fn call. Alerts the response
+    doesn't cover (or all of them, if it can't be parsed or the call
+    fails) are explained one by one with explain_fn.
+
+    Returns:
+    - Per-call stats, one dict per request made
+    """
+    if len(alerts) == 1:
+        return [_explain_one(alerts[0], bucket, max_retries, explain_fn)]
+
+    explanations, error, latency, attempts = _call_with_retries(
+        lambda: batch_fn(alerts), bucket, max_retries
+    )
+    calls = [{"latency": latency, "attempts": attempts, "ok": error is None, "batch": True}]
+
+    if error is not None:
+        reason = "unparseable response" if isinstance(error, BatchResponseError) else error
+        print(f"Batched explanation failed ({reason}), explaining {len(alerts)} alerts one by one")
+        explanations = [None] * len(alerts)
+
+    for alert, explanation in zip(alerts, explanations):
+        if explanation is None:
+            calls.append(_explain_one(alert, bucket, max_retries, explain_fn))
+            continue
+
+        alert["explanation"] = explanation
+        alert["explanation_latency_ms"] = round(latency * 1000, 1)
+        alert["explanation_attempts"] = attempts
+        alert["explanation_batch"] = len(alerts)
+
+    return calls
+
+
+def _batches(misses: list, groups: list, batch_size: int) -> list:
+    """
+    Packs misses of the same group into batches of up to batch_size,
+    keeping the priority order of each group's first alert.
+    """
+    if batch_size <= 1 or groups is None:
+        return [[miss] for miss in misses]
+
+    grouped = {}
+    for miss, group in zip(misses, groups):
+        grouped.setdefault(group, []).append(miss)
+
+    return [
+        members[i:i + batch_size]
+        for members in grouped.values()
+        for i in range(0, len(members), batch_size)
+    ]
+
+
+def _mark_cached(alert: dict, explanation: str):
+    alert["explanation"] = explanation
+    alert["explanation_latency_ms"] = 0.0
+    alert["explanation_attempts"] = 0
+    alert["explanation_cached"] = True
+
+
+def prioritize_alerts(alerts: list) -> list:
+    """
+    Alerts ordered critical first, then warning; stable otherwise.
+    """
+    return sorted(alerts, key=lambda alert: SEVERITY_PRIORITY.get(alert.get("severity"), len(SEVERITY_PRIORITY)))
+
+
+def explain_alerts(
+    alerts: list,
+    concurrency: int = None,
+    rate_per_sec: float = None,
+    max_retries: int = None,
+    explain_fn=None,
+    use_cache: bool = None,
+    progress=None,
+    time_budget: float = None,
+    groups: list = None,
+    batch_size: int = None,
+    batch_fn=None
+) -> dict:
+    """
+    Generates explanations for a batch of alerts concurrently.
+
+    Parameters:
+    - alerts: Alert dicts to explain (updated in place with
+      'explanation', 'explanation_latency_ms', 'explanation_attempts')
+    - concurrency: Max in-flight requests (default EXPLAIN_CONCURRENCY)
+    - rate_per_sec: Token bucket refill rate (default EXPLAIN_RATE_PER_SEC)
+    - max_retries: Retries on HTTP 429 (default EXPLAIN_MAX_RETRIES)
+    - explain_fn: Callable(alert) -> str, defaults to request_explanation
+      with the client's built-in retries disabled
+    - use_cache: Serve identical prompts from the explanation cache.
+      Defaults to on for the default explainer and off for a custom
+      explain_fn, whose output must not be cached as the model's
+    - progress: Optional callable(done, total), called from the worker
+      threads as alerts get their explanation
+    - time_budget: Seconds after which no new LLM call is started
+      (default EXPLAIN_TIME_BUDGET_SECONDS, 0 = no limit). Alerts left
+      over keep no 'explanation' and are counted as 'deferred'
+
+    - groups: Optional group id per alert (e.g. its investment id);
+      alerts of one group are explained together in batches
+    - batch_size: Max alerts per batched request (default
+      EXPLAIN_BATCH_SIZE, 1 = one request per alert)
+    - batch_fn: Callable(alerts) -> list of explanations (None where
+      missing), defaults to request_batch_explanation. Batching is off
+      when a custom explain_fn is given without one
+
+    Alerts are explained critical first, so a budget or rate limit
+    delays warnings rather than breaches. Each alert is cached under its
+    single-alert prompt, whether it was explained alone or in a batch.
+
+    Returns:
+    - Stage stats for the report summary
+    """
+    concurrency = concurrency or EXPLAIN_CONCURRENCY
+    rate_per_sec = EXPLAIN_RATE_PER_SEC if rate_per_sec is None else rate_per_sec
+    max_retries = EXPLAIN_MAX_RETRIES if max_retries is None else max_retries
+    time_budget = EXPLAIN_TIME_BUDGET_SECONDS if time_budget is None else time_budget
+    batch_size = batch_size or EXPLAIN_BATCH_SIZE
+
+    # Cache keys name OPENROUTER_MODEL, so only its explanations are cached
+    if use_cache is None:
+        use_cache = explain_fn is None
+
+    # The API key is only needed once there is a cache miss to send
+    needs_api_key = explain_fn is None
+
+    if explain_fn is None:
+        explain_fn = lambda alert: request_explanation(alert, max_retries=0)
+        batch_fn = batch_fn or (lambda batch: request_batch_explanation(batch, max_retries=0))
+
+    if batch_fn is None:
+        batch_size = 1
+
+    stats = {
+        "calls": 0,
+        "retries": 0,
+        "failures": 0,
+        "cache_hits": 0,
+        "cache_misses": 0,
+        "total_latency_ms": 0.0,
+        "max_latency_ms": 0.0,
+        "wall_time_ms": 0.0,
+        "deferred": 0,
+        "batched_alerts": 0,
+        "batch_fallbacks": 0
+    }
+
+    if not alerts:
+        return stats
+
+    start = time.perf_counter()
+    deadline = start + time_budget if time_budget and time_budget > 0 else None
+
+    group_of = None if groups is None else {id(alert): group for alert, group in zip(alerts, groups)}
+    alerts = prioritize_alerts(alerts)
+
+    # Serve unchanged alerts from the cache, only call the LLM for misses.
+    # Identical prompts within the run are also sent only once.
+    cache = get_explanation_cache() if use_cache else None
+    misses = []
+    duplicates = {}
+
+    for alert in alerts:
+        if cache is None:
+            misses.append((None, alert))
+            continue
+
+        key = cache_key(OPENROUTER_MODEL, SYSTEM_PROMPT, build_prompt(alert))
+
+        if key in duplicates:
+            stats["cache_hits"] += 1
+            duplicates[key].append(alert)
+            continue
+
+        cached = cache.get(key)
+
+        if cached is None:
+            stats["cache_misses"] += 1
+            duplicates[key] = []
+            misses.append((key, alert))
+        else:
+            stats["cache_hits"] += 1
+            _mark_cached(alert, cached)
+
+    if misses and needs_api_key:
+        check_api_key()
+
+    bucket = TokenBucket(rate_per_sec, EXPLAIN_BURST)
+
+    # Cache hits are done already; a miss also completes its duplicates
+    progress_lock = threading.Lock()
+    done = len(alerts) - len(misses) - sum(len(d) for d in duplicates.values())
+    if progress is not None:
+        progress(done, len(alerts))
+
+    def explain(batch):
+        nonlocal done
+
+        # Out of budget: leave it for a later explanation pass
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+
+        calls = _explain_batch([alert for _, alert in batch], bucket, max_retries, explain_fn, batch_fn)
+
+        if progress is not None:
+            with progress_lock:
+                for key, _ in batch:
+                    done += 1 + (len(duplicates[key]) if key is not None else 0)
+                current = done
+            progress(current, len(alerts))
+
+        return calls
+
+    batches = _batches(
+        misses,
+        None if group_of is None else [group_of[id(alert)] for _, alert in misses],
+        batch_size
+    )
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        results = list(pool.map(explain, batches))
+
+    for batch, calls in zip(batches, results):
+        if calls is None:
+            stats["deferred"] += sum(1 + (len(duplicates[key]) if key is not None else 0) for key, _ in batch)
+            continue
+
+        for key, alert in batch:
+            if key is None:
+                continue
+            for duplicate in duplicates[key]:
+                _mark_cached(duplicate, alert["explanation"])
+
+        for call in calls:
+            latency_ms = call["latency"] * 1000
+            stats["calls"] += 1
+            stats["retries"] += call["attempts"] - 1
+            stats["total_latency_ms"] += latency_ms
+            stats["max_latency_ms"] = max(stats["max_latency_ms"], latency_ms)
+            if call.get("batch"):
+                stats["batch_fallbacks"] += 0 if call["ok"] else 1
+            else:
+                stats["failures"] += 0 if call["ok"] else 1
+
+        # Fallback texts are not cached, so failed alerts are retried next run
+        failed = {id(call["alert"]) for call in calls if not call["ok"] and "alert" in call}
+        for key, alert in batch:
+            if "explanation_batch" in alert:
+                stats["batched_alerts"] += 1
+            if key is not None and id(alert) not in failed:
+                cache.put(key, alert["explanation"])
+
+    stats["total_latency_ms"] = round(stats["total_latency_ms"], 1)
+    stats["max_latency_ms"] = round(stats["max_latency_ms"], 1)
+    stats["wall_time_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    return stats
@@ -0,0 +1,323 @@
+import re
+import numpy as np
+import pandas as pd
+
+
+class ExpressionError(ValueError):
+    """
+    Raised when a rule expression can't be parsed.
+    """
+
+
+# ---------------------------
+# Tokenizer
+# ---------------------------
+# Column names may contain '-' (e.g. 'EBITDA-MM'), so subtraction needs
+# surrounding whitespace: 'EBITDA-MM - Capex-MM'. Names with other
+# characters can be written in brackets: '[Cash Balance]'.
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)
+      | (?P<name>[A-Za-z_][A-Za-z0-9_.]*(?:-[A-Za-z0-9_.]+)*)
+      | \[(?P<bracketed>[^\]]+)\]
+      | (?P<op>[-+*/(),])
+    )""", re.VERBOSE)
+
+
+def _tokenize(text: str) -> list:
+    tokens = []
+    pos = 0
+    text = text.strip()
+
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if not match:
+            raise ExpressionError(f"Unexpected character at {pos} in '{text}'")
+
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "bracketed":
+            kind = "name"
+        tokens.append((kind, value))
+        pos = match.end()
+
+    return tokens
+
+
+# ---------------------------
+# Parser -> expression tree
+# ---------------------------
+# Nodes are nested tuples, so identical subexpressions compare equal and
+# are only computed once:
+#   ("col", name) | ("num", value) | ("neg", a)
+#   ("add"|"sub"|"mul"|"div", a, b)
+#   (function, a, window) for WINDOW_FUNCTIONS, (function, a, b) for min/max
+#   ("abs", a)
+WINDOW_FUNCTIONS = ("rolling_sum", "rolling_mean", "rolling_min", "rolling_max", "lag")
+BINARY_FUNCTIONS = ("min", "max")
+UNARY_FUNCTIONS = ("abs",)
+
+_BINARY_OPS = {"+": "add", "-": "sub", "*": "mul", "/": "div"}
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        token = self.peek()
+        if token[0] is None or (value is not None and token[1] != value):
+            raise ExpressionError(f"Expected '{value or 'more input'}' in '{self.text}'")
+        self.pos += 1
+        return token
+
+    def parse(self):
+        node = self.expr()
+        if self.pos != len(self.tokens):
+            raise ExpressionError(f"Unexpected '{self.peek()[1]}' in '{self.text}'")
+        return node
+
+    def expr(self):
+        node = self.term()
+        while self.peek()[1] in ("+", "-"):
+            op = _BINARY_OPS[self.take()[1]]
+            node = (op, node, self.term())
+        return node
+
+    def term(self):
+        node = self.factor()
+        while self.peek()[1] in ("*", "/"):
+            op = _BINARY_OPS[self.take()[1]]
+            node = (op, node, self.factor())
+        return node
+
+    def factor(self):
+        if self.peek()[1] == "-":
+            self.take()
+            return ("neg", self.factor())
+        return self.primary()
+
+    def primary(self):
+        kind, value = self.take()
+
+        if kind == "number":
+            return ("num", float(value))
+
+        if kind == "op" and value == "(":
+            node = self.expr()
+            self.take(")")
+            return node
+
+        if kind != "name":
+            raise ExpressionError(f"Unexpected '{value}' in '{self.text}'")
+
+        if self.peek()[1] != "(":
+            return ("col", value)
+
+        # Function call
+        name = value.lower()
+        self.take("(")
+        args = [self.expr()]
+        while self.peek()[1] == ",":
+            self.take()
+            args.append(self.expr())
+        self.take(")")
+
+        if name in WINDOW_FUNCTIONS:
+            if len(args) != 2 or args[1][0] != "num" or args[1][1] < 1 or args[1][1] != int(args[1][1]):
+                raise ExpressionError(f"{name}(x, n) needs a positive whole window n in '{self.text}'")
+            return (name, args[0], int(args[1][1]))
+
+        if name in BINARY_FUNCTIONS:
+            if len(args) != 2:
+                raise ExpressionError(f"{name}(a, b) takes two arguments in '{self.text}'")
+            return (name, args[0], args[1])
+
+        if name in UNARY_FUNCTIONS:
+            if len(args) != 1:
+                raise ExpressionError(f"{name}(x) takes one argument in '{self.text}'")
+            return (name, args[0])
+
+        raise ExpressionError(f"Unknown function '{value}' in '{self.text}'")
+
+
+def parse_expression(text: str) -> tuple:
+    """
+    Parses an expression like 'EBITDA-MM / Interest-Expense' or
+    'rolling_sum(EBITDA-MM, 4) / Total-Debt' into a node tree.
+    """
+    return _Parser(str(text)).parse()
+
+
+# ---------------------------
+# Compiled plan
+# ---------------------------
+def _children(node: tuple) -> list:
+    kind = node[0]
+    if kind in ("col", "num"):
+        return []
+    if kind in WINDOW_FUNCTIONS or kind in ("neg",) or kind in UNARY_FUNCTIONS:
+        return [node[1]]
+    return [node[1], node[2]]
+
+
+class ExpressionPlan:
+    """
+    A set of derived metrics compiled into one evaluation order.
+
+    Every distinct subexpression appears once in `steps` (children before
+    parents), so subexpressions shared between rules are evaluated once
+    per DataFrame, each as a whole-column NumPy/pandas operation.
+    """
+
+    def __init__(self, expressions: dict):
+        self.expressions = dict(expressions)
+        self.steps = []
+        self.outputs = {}
+        self.columns = []
+        self.output_columns = {}
+        self.lookback = 0
+
+        index = {}
+        lookbacks = {}
+        node_columns = {}
+
+        def visit(node):
+            if node in index:
+                return
+            for child in _children(node):
+                visit(child)
+
+            kind = node[0]
+            child_lookback = max((lookbacks[c] for c in _children(node)), default=0)
+            if kind == "lag":
+                child_lookback += node[2]
+            elif kind in WINDOW_FUNCTIONS:
+                child_lookback += node[2] - 1
+            lookbacks[node] = child_lookback
+
+            node_columns[node] = frozenset().union(*(node_columns[c] for c in _children(node)))
+            if kind == "col":
+                node_columns[node] = frozenset([node[1]])
+                if node[1] not in self.columns:
+                    self.columns.append(node[1])
+
+            index[node] = len(self.steps)
+            self.steps.append(node)
+
+        for name, text in self.expressions.items():
+            node = parse_expression(text)
+            visit(node)
+            self.outputs[name] = index[node]
+            self.output_columns[name] = node_columns[node]
+            # Extra history rows needed for the latest value to be complete
+            self.lookback = max(self.lookback, lookbacks[node])
+
+        self._index = index
+
+    def __bool__(self):
+        return bool(self.outputs)
+
+    def defines(self, metric: str) -> bool:
+        return metric in self.outputs
+
+    def source_columns(self, metrics: list) -> list:
+        """
+        Columns to read for `metrics`: the raw ones plus the columns
+        derived metrics are computed from.
+        """
+        columns = [m for m in metrics if not self.defines(m)]
+        for metric in metrics:
+            if self.defines(metric):
+                columns += [c for c in self.columns if c in self.output_columns[metric] and c not in columns]
+        return columns
+
+    def metric_columns(self, metric: str) -> frozenset:
+        """
+        Source columns one metric is read or computed from.
+        """
+        return self.output_columns.get(metric, frozenset([metric]))
+
+    def evaluate(self, df: pd.DataFrame) -> dict:
+        """
+        Returns {derived metric: np.ndarray} for a DataFrame.
+        Metrics whose input columns are missing come out as NaN.
+        """
+        n = len(df)
+        values = []
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for node in self.steps:
+                values.append(self._evaluate_step(node, df, values, n))
+
+        return {name: values[i] for name, i in self.outputs.items()}
+
+    def _evaluate_step(self, node, df, values, n):
+        kind = node[0]
+        arg = lambda k: values[self._index[node[k]]]
+
+        if kind == "col":
+            if node[1] not in df.columns:
+                return np.full(n, np.nan)
+            return df[node[1]].to_numpy(dtype=float)
+        if kind == "num":
+            return np.full(n, node[1])
+        if kind == "neg":
+            return -arg(1)
+        if kind == "add":
+            return arg(1) + arg(2)
+        if kind == "sub":
+            return arg(1) - arg(2)
+        if kind == "mul":
+            return arg(1) * arg(2)
+        if kind == "div":
+            return arg(1) / arg(2)
+        if kind == "abs":
+            return np.abs(arg(1))
+        if kind == "min":
+            return np.minimum(arg(1), arg(2))
+        if kind == "max":
+            return np.maximum(arg(1), arg(2))
+        if kind == "lag":
+            shifted = np.full(n, np.nan)
+            if node[2] < n:
+                shifted[node[2]:] = arg(1)[:n - node[2]]
+            return shifted
+
+        rolling = pd.Series(arg(1)).rolling(node[2], min_periods=node[2])
+        if kind == "rolling_sum":
+            return rolling.sum().to_numpy()
+        if kind == "rolling_mean":
+            return rolling.mean().to_numpy()
+        if kind == "rolling_min":
+            return rolling.min().to_numpy()
+        return rolling.max().to_numpy()
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Returns df with the derived metrics added as columns.
+        """
+        if not self:
+            return df
+        return df.assign(**self.evaluate(df))
+
+
+def compile_rule_expressions(rules: list) -> ExpressionPlan:
+    """
+    Builds one plan for every rule that defines its metric with an
+    'expression' (rules.yaml), keyed by the rule's metric name.
+    """
+    expressions = {}
+    for rule in rules:
+        if rule.get("expression"):
+            metric = rule["metric"]
+            if metric in expressions and expressions[metric] != rule["expression"]:
+                raise ExpressionError(f"Metric '{metric}' has conflicting expressions")
+            expressions[metric] = rule["expression"]
+
+    return ExpressionPlan(expressions)
@@ -0,0 +1,450 @@
+import os
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from datetime import datetime
+from contextlib import closing
+
+# Append-only store of monitoring runs
+HISTORY_DB = os.getenv("HISTORY_DB", "history/history.db")
+
+# Legacy one-JSON-file-per-run reports, imported on first use
+HISTORY_DIR = os.getenv("HISTORY_DIR", "history")
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    source TEXT UNIQUE,
+    summary TEXT NOT NULL,
+    fingerprints TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_created_at ON runs (created_at);
+
+CREATE TABLE IF NOT EXISTS investments (
+    run_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    inv_id TEXT NOT NULL,
+    name TEXT,
+    type TEXT,
+    breaches INTEGER,
+    near_breaches INTEGER,
+    ideal INTEGER,
+    PRIMARY KEY (run_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_investments_inv ON investments (inv_id, run_id);
+
+CREATE TABLE IF NOT EXISTS alerts (
+    run_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    alert_index INTEGER NOT NULL,
+    inv_id TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    severity TEXT,
+    status TEXT,
+    current_value REAL,
+    limit_value REAL,
+    trend TEXT,
+    rate_of_change REAL,
+    trend_confidence TEXT,
+    explanation TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (run_id, position, alert_index)
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_inv_metric ON alerts (inv_id, metric, run_id);
+CREATE INDEX IF NOT EXISTS idx_alerts_severity ON alerts (run_id, severity);
+"""
+
+# Alert fields kept in their own columns; everything else goes in `data`
+_ALERT_COLUMNS = {
+    "metric": "metric",
+    "severity": "severity",
+    "status": "status",
+    "current_value": "current_value",
+    "limit": "limit_value",
+    "trend": "trend",
+    "rate_of_change": "rate_of_change",
+    "trend_confidence": "trend_confidence",
+    "explanation": "explanation",
+}
+
+
+def _json_default(value):
+    # numpy scalars (np.float64 trend values, np.bool_) -> plain Python
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def _dumps(value) -> str:
+    # Compact JSON keeps the store small as runs accumulate
+    return json.dumps(value, separators=(",", ":"), default=_json_default)
+
+
+# Store files this process has already set up
+_initialized = set()
+_init_lock = threading.Lock()
+
+
+def _connect(path: str = None) -> sqlite3.Connection:
+    path = Path(path or HISTORY_DB)
+    key = str(path.resolve())
+
+    if key not in _initialized:
+        with _init_lock:
+            if key not in _initialized:
+                _initialize(path)
+                _initialized.add(key)
+
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _initialize(path: Path):
+    """
+    Creates the schema (WAL mode persists in the file) and imports legacy
+    reports into a new store. Runs once per path and process; the import
+    itself is safe against another process initializing the same store.
+    """
+    is_new = not path.exists()
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with closing(sqlite3.connect(path, timeout=30)) as conn:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.executescript(SCHEMA)
+
+        if is_new:
+            import_legacy_reports(conn)
+
+
+def _insert_report(conn: sqlite3.Connection, report: dict, created_at: str, source: str = None) -> int:
+    cursor = conn.execute(
+        "INSERT INTO runs (created_at, source, summary, fingerprints) VALUES (?, ?, ?, ?)",
+        (
+            created_at,
+            source,
+            _dumps(report["summary"]),
+            _dumps(report["fingerprints"]) if "fingerprints" in report else None,
+        )
+    )
+    run_id = cursor.lastrowid
+
+    investment_rows = []
+    alert_rows = []
+
+    for position, inv in enumerate(report["investments"]):
+        inv_id = str(inv["id"])
+        investment_rows.append((
+            run_id, position, inv_id, inv.get("name"), inv.get("type"),
+            inv.get("breaches"), inv.get("near_breaches"), inv.get("ideal"),
+        ))
+
+        for alert_index, alert in enumerate(inv.get("alerts", [])):
+            alert_rows.append((
+                run_id, position, alert_index, inv_id,
+                *(alert.get(key) for key in _ALERT_COLUMNS),
+                _dumps(alert),
+            ))
+
+    conn.executemany(
+        "INSERT INTO investments VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        investment_rows
+    )
+    conn.executemany(
+        "INSERT INTO alerts (run_id, position, alert_index, inv_id, "
+        + ", ".join(_ALERT_COLUMNS.values())
+        + ", data) VALUES (" + ", ".join("?" * (len(_ALERT_COLUMNS) + 5)) + ")",
+        alert_rows
+    )
+
+    return run_id
+
+
+def save_report(report: dict, path: str = None) -> int:
+    """
+    Appends a report to the history store and returns its run_id.
+    """
+    created_at = datetime.now().strftime(TIMESTAMP_FORMAT)
+
+    with closing(_connect(path)) as conn, conn:
+        return _insert_report(conn, report, created_at)
+
+
+def save_explanations(run_id: int, report: dict, alerts: list = None, path: str = None) -> int:
+    """
+    Patches explanations produced after a run was saved into its stored
+    alerts, and replaces the run's summary with report["summary"].
+
+    Parameters:
+    - run_id: Run the report was saved as
+    - report: The saved report, with explanations filled in since
+    - alerts: Only patch these alert dicts of the report (default: every
+      alert that has an explanation)
+
+    Returns:
+    - Number of alerts updated
+    """
+    wanted = None if alerts is None else {id(alert) for alert in alerts}
+    rows = []
+
+    for position, inv in enumerate(report["investments"]):
+        for alert_index, alert in enumerate(inv.get("alerts", [])):
+            if "explanation" not in alert:
+                continue
+            if wanted is not None and id(alert) not in wanted:
+                continue
+            rows.append((alert["explanation"], _dumps(alert), run_id, position, alert_index))
+
+    with closing(_connect(path)) as conn, conn:
+        conn.executemany(
+            "UPDATE alerts SET explanation = ?, data = ?"
+            " WHERE run_id = ? AND position = ? AND alert_index = ?",
+            rows
+        )
+        conn.execute(
+            "UPDATE runs SET summary = ? WHERE run_id = ?",
+            (_dumps(report["summary"]), run_id)
+        )
+
+    return len(rows)
+
+
+def store_version(path: str = None) -> tuple:
+    """
+    Cheap change marker for the store: (mtime_ns, size) of the database
+    and its WAL file, which change whenever a run is written. Lets
+    readers cache query results until the next write.
+    """
+    path = str(path or HISTORY_DB)
+    version = []
+    for name in (path, path + "-wal"):
+        try:
+            stat = os.stat(name)
+            version.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            version.append(None)
+    return tuple(version)
+
+
+def import_legacy_reports(conn: sqlite3.Connection, history_dir: str = None) -> int:
+    """
+    Imports <history_dir>/<timestamp>.json reports not imported yet
+    (default HISTORY_DIR). Returns the number of reports imported.
+    """
+    history_dir = history_dir or HISTORY_DIR
+    if not os.path.exists(history_dir):
+        return 0
+
+    # Hold the write lock throughout, so a concurrent import by another
+    # process waits and then skips the reports imported here
+    conn.execute("BEGIN IMMEDIATE")
+
+    imported = 0
+    for name in sorted(os.listdir(history_dir)):
+        if not name.endswith(".json"):
+            continue
+
+        if conn.execute("SELECT 1 FROM runs WHERE source = ?", (name,)).fetchone():
+            continue
+
+        try:
+            created_at = datetime.strptime(name[:-5], "%Y-%m-%d_%H-%M-%S").strftime(TIMESTAMP_FORMAT)
+            with open(os.path.join(history_dir, name), "r") as f:
+                report = json.load(f)
+        except (ValueError, OSError) as e:
+            print(f"Skipping legacy report {name}: {e}")
+            continue
+
+        _insert_report(conn, report, created_at, source=name)
+        imported += 1
+
+    conn.commit()
+    return imported
+
+
+def list_runs(limit: int = 50, offset: int = 0, path: str = None) -> list:
+    """
+    Newest-first page of runs with their summaries.
+    """
+    with closing(_connect(path)) as conn:
+        rows = conn.execute(
+            "SELECT run_id, created_at, summary FROM runs"
+            " ORDER BY created_at DESC, run_id DESC LIMIT ? OFFSET ?",
+            (limit, offset)
+        ).fetchall()
+
+    return [
+        {"run_id": row["run_id"], "created_at": row["created_at"], "summary": json.loads(row["summary"])}
+        for row in rows
+    ]
+
+
+def count_runs(path: str = None) -> int:
+    with closing(_connect(path)) as conn:
+        return conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+
+def load_run_investments(
+    run_id: int,
+    inv_id=None,
+    severities: list = None,
+    limit: int = None,
+    offset: int = 0,
+    path: str = None
+) -> list:
+    """
+    Investment entries of one run, optionally filtered by investment id
+    and by alert severity (only matching alerts are returned).
+    """
+    query = "SELECT * FROM investments WHERE run_id = ?"
+    params = [run_id]
+
+    if inv_id is not None:
+        query += " AND inv_id = ?"
+        params.append(str(inv_id))
+
+    query += " ORDER BY position LIMIT ? OFFSET ?"
+    params += [-1 if limit is None else limit, offset]
+
+    with closing(_connect(path)) as conn:
+        investments = conn.execute(query, params).fetchall()
+        if not investments:
+            return []
+
+        alert_query = (
+            "SELECT position, data FROM alerts WHERE run_id = ?"
+            " AND position BETWEEN ? AND ?"
+        )
+        alert_params = [run_id, investments[0]["position"], investments[-1]["position"]]
+
+        if severities:
+            alert_query += f" AND severity IN ({', '.join('?' * len(severities))})"
+            alert_params += list(severities)
+
+        alerts = {}
+        for row in conn.execute(alert_query + " ORDER BY position, alert_index", alert_params):
+            alerts.setdefault(row["position"], []).append(json.loads(row["data"]))
+
+    entries = []
+    for row in investments:
+        entry_id = row["inv_id"]
+        entries.append({
+            "id": int(entry_id) if entry_id.lstrip("-").isdigit() else entry_id,
+            "name": row["name"],
+            "type": row["type"],
+            "breaches": row["breaches"],
+            "near_breaches": row["near_breaches"],
+            "ideal": row["ideal"],
+            "alerts": alerts.get(row["position"], []),
+        })
+
+    return entries
+
+
+def load_report(run_id: int, path: str = None):
+    """
+    Rebuilds the full report dict of a run, or None if it doesn't exist.
+    """
+    with closing(_connect(path)) as conn:
+        row = conn.execute(
+            "SELECT summary, fingerprints FROM runs WHERE run_id = ?", (run_id,)
+        ).fetchone()
+
+    if row is None:
+        return None
+
+    report = {
+        "summary": json.loads(row["summary"]),
+        "investments": load_run_investments(run_id, path=path),
+    }
+    if row["fingerprints"]:
+        report["fingerprints"] = json.loads(row["fingerprints"])
+    report["run_id"] = run_id
+
+    return report
+
+
+def latest_report(path: str = None):
+    """
+    The most recent report, or None if no runs are stored.
+    """
+    runs = list_runs(limit=1, path=path)
+    return load_report(runs[0]["run_id"], path=path) if runs else None
+
+
+# Severity as a number, for charting
+SEVERITY_SCORES = {"ok": 0, "warning": 1, "critical": 2}
+
+
+def list_metrics(inv_id, path: str = None) -> list:
+    """
+    Metrics that have alerts recorded for an investment.
+    """
+    with closing(_connect(path)) as conn:
+        rows = conn.execute(
+            "SELECT DISTINCT metric FROM alerts WHERE inv_id = ? ORDER BY metric",
+            (str(inv_id),)
+        ).fetchall()
+
+    return [row["metric"] for row in rows]
+
+
+def query_series(
+    inv_id,
+    metric: str,
+    last_n: int = 90,
+    since: str = None,
+    path: str = None
+) -> list:
+    """
+    How one investment's metric evolved across runs.
+
+    Parameters:
+    - inv_id: Investment id
+    - metric: Metric name (e.g. 'Debt-to-EBITDA')
+    - last_n: Number of most recent runs to return (None for all)
+    - since: Only runs created at or after this 'YYYY-MM-DD HH:MM:SS'
+
+    Returns:
+    - Oldest-first list of dicts: run_id, created_at, severity,
+      severity_score, status, current_value, limit, trend,
+      rate_of_change, trend_confidence
+    """
+    # Served by idx_alerts_inv_metric (inv_id, metric, run_id)
+    query = (
+        "SELECT a.run_id, r.created_at, a.severity, a.status, a.current_value,"
+        " a.limit_value, a.trend, a.rate_of_change, a.trend_confidence"
+        " FROM alerts a JOIN runs r ON r.run_id = a.run_id"
+        " WHERE a.inv_id = ? AND a.metric = ?"
+    )
+    params = [str(inv_id), metric]
+
+    if since is not None:
+        query += " AND r.created_at >= ?"
+        params.append(since)
+
+    query += " ORDER BY a.run_id DESC LIMIT ?"
+    params.append(-1 if last_n is None else last_n)
+
+    with closing(_connect(path)) as conn:
+        rows = conn.execute(query, params).fetchall()
+
+    return [
+        {
+            "run_id": row["run_id"],
+            "created_at": row["created_at"],
+            "severity": row["severity"],
+            "severity_score": SEVERITY_SCORES.get(row["severity"]),
+            "status": row["status"],
+            "current_value": row["current_value"],
+            "limit": row["limit_value"],
+            "trend": row["trend"],
+            "rate_of_change": row["rate_of_change"],
+            "trend_confidence": row["trend_confidence"],
+        }
+        for row in reversed(rows)
+    ]
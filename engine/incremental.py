@@ -0,0 +1,81 @@
+import json
+import hashlib
+from engine.data_loader import source_fingerprint
+from engine.history_store import latest_report
+
+
+def _digest(payload) -> str:
+    text = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def rules_fingerprint(rules: list) -> str:
+    """
+    Hash of the rule set as loaded from config/rules.yaml.
+    """
+    return _digest(rules)
+
+
+def investment_fingerprint(inv: dict):
+    """
+    Hash of an investment's config plus its data source's mtime/size.
+    None means the source can't be fingerprinted and must be re-checked.
+    """
+    source = source_fingerprint(inv.get("data_source", {}))
+    if source is None:
+        return None
+
+    return _digest([inv, source])
+
+
+def load_previous_report():
+    """
+    Returns the most recent report in the history store, or None.
+    """
+    return latest_report()
+
+
+def find_unchanged(
+    investments: list,
+    fingerprints: list,
+    rules_fp: str,
+    previous: dict,
+    recheck: set = None
+) -> dict:
+    """
+    Finds investments whose previous results can be carried forward.
+
+    Parameters:
+    - investments: Investment dicts for this run
+    - fingerprints: investment_fingerprint() of each, same order
+    - rules_fp: rules_fingerprint() for this run
+    - previous: Last report (with its 'fingerprints' block), or None
+    - recheck: Optional ids known to have changed (e.g. from a file
+      watcher). They are always re-checked, and investments that can't
+      be fingerprinted (APIs) are otherwise assumed unchanged.
+
+    Returns:
+    - {position in investments: previous report entry}
+    """
+    if not previous or "fingerprints" not in previous:
+        return {}
+
+    if previous["fingerprints"].get("rules") != rules_fp:
+        return {}
+
+    previous_fps = previous["fingerprints"].get("investments", {})
+    previous_entries = {str(entry["id"]): entry for entry in previous["investments"]}
+
+    unchanged = {}
+    for i, (inv, fp) in enumerate(zip(investments, fingerprints)):
+        key = str(inv["id"])
+        if key not in previous_entries:
+            continue
+
+        if recheck is not None:
+            if key not in recheck and (fp is None or previous_fps.get(key) == fp):
+                unchanged[i] = previous_entries[key]
+        elif fp is not None and previous_fps.get(key) == fp:
+            unchanged[i] = previous_entries[key]
+
+    return unchanged
@@ -0,0 +1,156 @@
+import os
+import time
+import pstats
+import cProfile
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager
+
+# Metrics export file (empty = off) and per-stage cProfile dumps
+METRICS_EXPORT_PATH = os.getenv("METRICS_EXPORT_PATH", "")
+PIPELINE_PROFILE = os.getenv("PIPELINE_PROFILE", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+METRIC_PREFIX = "covenant_pipeline"
+
+
+class RunMetrics:
+    """
+    Timings and counters of one pipeline run.
+
+    - stage(name): context manager adding wall time to a stage
+    - count(name, n): increments a counter
+    - investment(inv_id, **values): per-investment measurements
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.stages = {}
+        self.counters = {}
+        self.investments = {}
+        self.profile_path = None
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, (time.perf_counter() - start) * 1000)
+
+    def add_time(self, name: str, ms: float):
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def count(self, name: str, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def investment(self, inv_id, **values):
+        self.investments.setdefault(str(inv_id), {}).update(values)
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def summary(self) -> dict:
+        """
+        Stage timings and counters, small enough to store with every run.
+        """
+        summary = {
+            "total_ms": round(self.total_ms(), 1),
+            "stages_ms": {name: round(ms, 1) for name, ms in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+        if self.profile_path:
+            summary["profile"] = self.profile_path
+        return summary
+
+    def to_prometheus(self, prefix: str = METRIC_PREFIX) -> str:
+        """
+        Prometheus text exposition format (e.g. for node_exporter's
+        textfile collector). Values describe the last run.
+        """
+        lines = [
+            f"# HELP {prefix}_last_run_timestamp_seconds Start time of the last run.",
+            f"# TYPE {prefix}_last_run_timestamp_seconds gauge",
+            f"{prefix}_last_run_timestamp_seconds {self.started_at:.3f}",
+            f"# HELP {prefix}_run_seconds Wall time of the last run.",
+            f"# TYPE {prefix}_run_seconds gauge",
+            f"{prefix}_run_seconds {self.total_ms() / 1000:.6f}",
+            f"# HELP {prefix}_stage_seconds Wall time per pipeline stage in the last run.",
+            f"# TYPE {prefix}_stage_seconds gauge",
+        ]
+        lines += [
+            f'{prefix}_stage_seconds{{stage="{_label(name)}"}} {ms / 1000:.6f}'
+            for name, ms in self.stages.items()
+        ]
+
+        for name, value in self.counters.items():
+            metric = f"{prefix}_{name}"
+            lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+
+        if self.investments:
+            fields = sorted({key for values in self.investments.values() for key in values})
+            for field in fields:
+                metric = f"{prefix}_investment_{field}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines += [
+                    f'{metric}{{investment="{_label(inv_id)}"}} {values[field]}'
+                    for inv_id, values in self.investments.items() if field in values
+                ]
+
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str = None):
+        """
+        Writes the Prometheus text file if METRICS_EXPORT_PATH (or path)
+        is set. Written via rename so scrapers never read a partial file.
+        """
+        path = path or METRICS_EXPORT_PATH
+        if not path:
+            return None
+
+        target = Path(path)
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(self.to_prometheus())
+            os.replace(tmp, target)
+        except OSError as e:
+            print(f"Could not export metrics to {path}: {e}")
+            return None
+
+        return str(target)
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+@contextmanager
+def profiled(metrics: RunMetrics, enabled: bool = None):
+    """
+    Runs the block under cProfile when enabled (default PIPELINE_PROFILE)
+    and saves the stats to PROFILE_DIR/run-<timestamp>.prof; view with
+    `python -m pstats <file>` or snakeviz. Only the calling process is
+    profiled, not pipeline worker processes.
+    """
+    if not (PIPELINE_PROFILE if enabled is None else enabled):
+        yield
+        return
+
+    # Known up front so the run's stored summary can point at it
+    path = Path(PROFILE_DIR) / f"run-{datetime.now():%Y-%m-%d_%H-%M-%S}.prof"
+    metrics.profile_path = str(path)
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            pstats.Stats(profiler).dump_stats(path)
+        except OSError as e:
+            metrics.profile_path = None
+            print(f"Could not save profile: {e}")
@@ -1,10 +1,8 @@
 import os
+import json
+import threading
+from functools import lru_cache
 from pathlib import Path
-from dotenv import load_dotenv
-from openai import OpenAI
-
-# Load environment variables
-load_dotenv()
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1")
@@ -13,24 +11,42 @@ OPENROUTER_MODEL = os.getenv(
     "google/gemini-2.0-flash-exp:free"
 )
 
-# Initialize OpenRouter client with proper configuration
-client = OpenAI(
-    base_url=OPENROUTER_URL,
-    api_key=OPENROUTER_API_KEY,
-)
+# OpenRouter client, created by get_client() on the first explanation
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Returns the shared OpenRouter client, creating it on first use.
+
+    The openai package is imported here rather than at module load, so
+    runs that need no explanation never pay for it.
+    """
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI
+
+            _client = OpenAI(
+                base_url=OPENROUTER_URL,
+                api_key=OPENROUTER_API_KEY,
+            )
+
+    return _client
+
 
 # Path to prompt file
 BASE_DIR = Path(__file__).resolve().parents[1]
 PROMPT_PATH = Path("prompts/explanation_prompt.txt")
 
 
+@lru_cache(maxsize=None)
 def load_prompt_template() -> str:
     """
-    Loads the explanation prompt template from file.
+    Loads the explanation prompt template from file, once per process.
     """
-    print("looking for prompt at:", PROMPT_PATH)
-    print("Exists:", PROMPT_PATH.exists())
-    
     if not PROMPT_PATH.exists():
         raise FileNotFoundError(
             f"Prompt file not found at {PROMPT_PATH.resolve()}"
@@ -40,21 +56,21 @@ def load_prompt_template() -> str:
         return f.read()
 
 
-def generate_explanation(alert: dict) -> str:
+SYSTEM_PROMPT = (
+    "You are a risk monitoring assistant. "
+    "Your job is to clearly explain covenant alerts "
+    "based only on structured data provided to you. "
+    "Do not speculate or provide advice."
+)
+
+
+def build_prompt(alert: dict) -> str:
     """
-    Generates a human-readable explanation for a covenant alert.
+    Renders the explanation prompt for a single alert.
     """
-    
-    # Validate API key
-    if not OPENROUTER_API_KEY:
-        raise ValueError(
-            "OPENROUTER_API_KEY not found in environment variables. "
-            "Please check your .env file."
-        )
-
     prompt_template = load_prompt_template()
 
-    prompt = prompt_template.format(
+    return prompt_template.format(
         metric=alert["metric"],
         current_value=alert["current_value"],
         limit=alert["limit"],
@@ -65,36 +81,201 @@ def generate_explanation(alert: dict) -> str:
     )
 
 
+# Batched prompts reuse the template: its alert fields once per alert,
+# its instructions (from this line on) once per batch
+_INSTRUCTIONS_MARKER = "Please explain"
+
+BATCH_PROMPT_HEADER = (
+    "Explain each of the following {count} covenant monitoring alerts "
+    "of the same investment in simple, non-technical English."
+)
+
+BATCH_RESPONSE_FORMAT = (
+    "Respond with JSON only, no other text, in this format:\n"
+    '{"explanations": [{"id": 1, "explanation": "..."}, {"id": 2, "explanation": "..."}]}\n'
+    "Include exactly one entry per alert id."
+)
+
+
+class BatchResponseError(ValueError):
+    """
+    A batched completion that could not be parsed into explanations.
+    """
+
+
+@lru_cache(maxsize=None)
+def _split_template(template: str) -> tuple:
+    lines = template.splitlines()
+    first = next((i for i, line in enumerate(lines) if "{" in line), 0)
+    marker = next(
+        (i for i, line in enumerate(lines) if line.startswith(_INSTRUCTIONS_MARKER)),
+        len(lines)
+    )
+    return "\n".join(lines[first:marker]).strip(), "\n".join(lines[marker:]).strip()
+
+
+def build_batch_prompt(alerts: list) -> str:
+    """
+    Renders one prompt for several alerts: the template's alert fields
+    for each alert (numbered by id from 1), its instructions once, and
+    the JSON response format.
+    """
+    fields, instructions = _split_template(load_prompt_template())
+
+    blocks = [
+        f"Alert {i}:\n" + fields.format(
+            metric=alert["metric"],
+            current_value=alert["current_value"],
+            limit=alert["limit"],
+            status=alert["status"],
+            trend=alert["trend"],
+            rate_of_change=alert["rate_of_change"],
+            trend_confidence=alert["trend_confidence"],
+        )
+        for i, alert in enumerate(alerts, start=1)
+    ]
+
+    return "\n\n".join([
+        BATCH_PROMPT_HEADER.format(count=len(alerts)),
+        *blocks,
+        instructions.replace("the explanation", "each explanation"),
+        BATCH_RESPONSE_FORMAT,
+    ])
+
+
+def parse_batch_response(text: str, count: int) -> list:
+    """
+    Explanations from a batched completion, in alert order.
+
+    Parameters:
+    - text: Completion text; may be wrapped in a ```json fence
+    - count: Number of alerts in the batch
+
+    Returns:
+    - List of `count` explanations, None for ids missing in the response
+
+    Raises BatchResponseError if the text holds no usable JSON.
+    """
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise BatchResponseError("No JSON object in batched response")
+
     try:
-        response = client.chat.completions.create(
-            model=OPENROUTER_MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a risk monitoring assistant. "
-                        "Your job is to clearly explain covenant alerts "
-                        "based only on structured data provided to you. "
-                        "Do not speculate or provide advice."
-                    )
-                },
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1000,
-            temperature=0.5,
-            extra_headers={
-                "HTTP-Referer": "http://localhost",
-                "X-Title": "CBDA Hackathon App"
-            }
+        items = json.loads(text[start:end + 1])["explanations"]
+        explanations = [None] * count
+        for item in items:
+            index = int(item["id"]) - 1
+            explanation = str(item["explanation"]).strip()
+            if 0 <= index < count and explanation:
+                explanations[index] = explanation
+    except (ValueError, KeyError, TypeError) as e:
+        raise BatchResponseError(f"Malformed batched response: {e}") from None
+
+    if not any(explanations):
+        raise BatchResponseError("Batched response has no explanations")
+
+    return explanations
+
+
+def check_api_key():
+    """
+    Raises if no OpenRouter API key is configured.
+    """
+    if not OPENROUTER_API_KEY:
+        raise ValueError(
+            "OPENROUTER_API_KEY not found in environment variables. "
+            "Please check your .env file."
         )
 
-        return response.choices[0].message.content.strip()
-    
+
+def request_explanation(alert: dict, max_retries: int = None) -> str:
+    """
+    Sends a single chat completion for an alert and returns the text.
+
+    Unlike generate_explanation, API errors are raised to the caller so
+    that it can decide whether to retry (e.g. on HTTP 429). Pass
+    max_retries=0 to disable the OpenAI client's own retries.
+    """
+    check_api_key()
+
+    prompt = build_prompt(alert)
+
+    client = get_client()
+    api = client if max_retries is None else client.with_options(max_retries=max_retries)
+
+    response = api.chat.completions.create(
+        model=OPENROUTER_MODEL,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=1000,
+        temperature=0.5,
+        extra_headers={
+            "HTTP-Referer": "http://localhost",
+            "X-Title": "CBDA Hackathon App"
+        }
+    )
+
+    return response.choices[0].message.content.strip()
+
+
+def request_batch_explanation(alerts: list, max_retries: int = None) -> list:
+    """
+    Sends one chat completion explaining several alerts (see
+    build_batch_prompt) and returns their explanations in order, None
+    where the response has none.
+
+    API errors are raised like in request_explanation; an unparseable
+    response raises BatchResponseError.
+    """
+    check_api_key()
+
+    prompt = build_batch_prompt(alerts)
+
+    client = get_client()
+    api = client if max_retries is None else client.with_options(max_retries=max_retries)
+
+    response = api.chat.completions.create(
+        model=OPENROUTER_MODEL,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=1000 * len(alerts),
+        temperature=0.5,
+        extra_headers={
+            "HTTP-Referer": "http://localhost",
+            "X-Title": "CBDA Hackathon App"
+        }
+    )
+
+    return parse_batch_response(response.choices[0].message.content or "", len(alerts))
+
+
+def fallback_explanation(alert: dict) -> str:
+    """
+    Basic templated explanation used when the API call fails.
+    """
+    return (
+        f"Alert: {alert['metric']} is currently {alert['current_value']}, "
+        f"which is {alert['status']} the limit of {alert['limit']}. "
+        f"Trend: {alert['trend']} ({alert['trend_confidence']} confidence)."
+    )
+
+
+def generate_explanation(alert: dict) -> str:
+    """
+    Generates a human-readable explanation for a covenant alert.
+    """
+
+    # Validate API key
+    check_api_key()
+
+    try:
+        return request_explanation(alert)
+
     except Exception as e:
         print(f"Error calling OpenRouter API: {e}")
         # Fallback to a basic explanation if API fails
-        return (
-            f"Alert: {alert['metric']} is currently {alert['current_value']}, "
-            f"which is {alert['status']} the limit of {alert['limit']}. "
-            f"Trend: {alert['trend']} ({alert['trend_confidence']} confidence)."
-        )
\ No newline at end of file
+        return fallback_explanation(alert)
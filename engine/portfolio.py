@@ -0,0 +1,334 @@
+import os
+import math
+import time
+import numpy as np
+import pandas as pd
+from itertools import repeat
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from engine import data_loader
+from engine.data_loader import (
+    load_data_from_investment,
+    prefetch_api_sources,
+    run_scope,
+    source_columns,
+    source_cache_stats,
+)
+from engine.expressions import ExpressionPlan
+from engine.rule_engine import latest_values_matrix
+from engine.trend_analyser import analyze_trends_batch
+
+# Number of processes used to load/prepare investments
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "1"))
+
+# Investments per task handed to a worker process
+PIPELINE_CHUNK_SIZE = int(os.getenv("PIPELINE_CHUNK_SIZE", "0"))
+
+
+def _prepare_chunk(
+    investments: list,
+    metrics: list,
+    window: int,
+    data_folder: str,
+    binary_cache_dir: str,
+    expressions: ExpressionPlan = None,
+    metric_masks: list = None,
+    progress=None
+):
+    """
+    Loads a chunk of investments and reduces each one to what the rule and
+    alert stages need: the latest value of every metric and its trend.
+    Only these small results travel back from worker processes, not the
+    DataFrames. progress(done) is called after each investment (in-process
+    runs only). The data folder and binary cache dir are passed in
+    explicitly, as spawned workers don't inherit the parent's settings.
+    """
+    data_loader.default_folder = data_folder
+    data_loader.BINARY_CACHE_DIR = binary_cache_dir
+    expressions = expressions or ExpressionPlan({})
+    if metric_masks is None:
+        metric_masks = [None] * len(investments)
+
+    # Only the rule metrics and the trend window (plus the history rolling
+    # expressions look back over) are ever used
+    tail = window + expressions.lookback
+
+    frames = []
+    available = np.zeros((len(investments), len(metrics)), dtype=bool)
+
+    # Timings and counters for the run's instrumentation
+    cache_before = source_cache_stats()
+    stats = {"load_ms": 0.0, "latest_ms": 0.0, "trends_ms": 0.0, "investments": []}
+    start = time.perf_counter()
+
+    with run_scope():
+        prefetch_api_sources(investments)
+        stats["prefetch_ms"] = (time.perf_counter() - start) * 1000
+
+        for i, (inv, mask) in enumerate(zip(investments, metric_masks)):
+            load_start = time.perf_counter()
+
+            # Only the metrics of rules that apply to this investment
+            wanted = metrics if mask is None else [m for m, use in zip(metrics, mask) if use]
+            columns = expressions.source_columns(wanted)
+
+            df = _numeric(load_data_from_investment(inv, columns=columns, tail=tail))
+
+            loaded = set(df.columns)
+            available[i] = [
+                metric in wanted and expressions.metric_columns(metric) <= loaded
+                for metric in metrics
+            ]
+            frames.append(expressions.apply(df))
+
+            load_ms = (time.perf_counter() - load_start) * 1000
+            stats["investments"].append({"load_ms": round(load_ms, 3), "rows": len(df), "columns": sorted(loaded)})
+            stats["load_ms"] += load_ms
+
+            if progress is not None:
+                progress(i + 1)
+
+    start = time.perf_counter()
+    latest = latest_values_matrix(frames, metrics, allow_missing=True)
+    stats["latest_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    trends = analyze_trends_batch(frames, metrics, window)
+    stats["trends_ms"] = (time.perf_counter() - start) * 1000
+
+    cache_after = source_cache_stats()
+    stats["cache_hits"] = cache_after["hits"] - cache_before["hits"]
+    stats["cache_misses"] = cache_after["misses"] - cache_before["misses"]
+
+    return latest, trends, available, stats
+
+
+def _numeric(df):
+    """
+    Metric columns as float64. Cells that aren't numbers (e.g. '--' or
+    'n.a.' in a source file) become NaN instead of failing the load.
+    """
+    converted = {
+        column: pd.to_numeric(df[column], errors="coerce").astype("float64")
+        for column in df.columns
+        if df[column].dtype != "float64"
+    }
+    return df.assign(**converted) if converted else df
+
+
+def _merge_stats(chunk_stats: list) -> dict:
+    merged = {"investments": []}
+    for stats in chunk_stats:
+        for key, value in stats.items():
+            if key == "investments":
+                merged["investments"] += value
+            else:
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def applicability_matrix(investments: list, rule_set) -> np.ndarray:
+    """
+    (investments x rules) mask of the pairs worth evaluating: the rule's
+    applies_to matches the investment and its data source has the columns
+    the rule's metric needs. Source columns come from cheap header
+    probes; sources that can't be probed (APIs) are narrowed after load.
+    """
+    applicable = np.empty((len(investments), len(rule_set)), dtype=bool)
+
+    for i, inv in enumerate(investments):
+        mask = rule_set.attribute_mask(inv)
+
+        if mask.any():
+            columns = source_columns(inv)
+            if columns is not None:
+                mask = mask & rule_set.column_mask(columns)
+
+        applicable[i] = mask
+
+    return applicable
+
+
+def missing_columns(investments: list, rule_set, applicable: np.ndarray, loaded: list) -> list:
+    """
+    Rules that apply to an investment (applies_to) but were skipped
+    because its data source lacks columns their metric needs.
+
+    Parameters:
+    - investments: Investment dicts, same order as applicable
+    - rule_set: Compiled RuleSet
+    - applicable: Final (investments x rules) mask of evaluated pairs
+    - loaded: Columns each investment's load returned (used for sources
+      that can't be probed, e.g. APIs)
+
+    Returns:
+    - One list per investment of {"metric", "columns"}, where columns
+      are the missing source columns
+    """
+    missing = []
+
+    for i, inv in enumerate(investments):
+        skipped = rule_set.attribute_mask(inv) & ~applicable[i]
+        entries = []
+
+        if skipped.any():
+            columns = source_columns(inv)
+            columns = set(loaded[i] if columns is None else columns)
+            for rule_index in np.flatnonzero(skipped):
+                entries.append({
+                    "metric": rule_set.rules[rule_index]["metric"],
+                    "columns": sorted(rule_set.rule_columns[rule_index] - columns)
+                })
+
+        missing.append(entries)
+
+    return missing
+
+
+def metric_masks(applicable: np.ndarray, rule_set) -> np.ndarray:
+    """
+    (investments x metrics) mask of the metrics each investment needs.
+    """
+    masks = np.zeros((applicable.shape[0], len(rule_set.metrics)), dtype=bool)
+    for rule_index, column in enumerate(rule_set.column):
+        masks[:, column] |= applicable[:, rule_index]
+    return masks
+
+
+# Pool kept alive by warm_pool(), reused by prepare_portfolio
+_warm_pool = None
+
+
+@contextmanager
+def warm_pool(workers: int = None):
+    """
+    Keeps one worker pool alive across prepare_portfolio calls (e.g. in
+    the scheduler daemon), so worker processes keep their imports,
+    source caches and SQLite connections between runs.
+    """
+    global _warm_pool
+    workers = workers or PIPELINE_WORKERS
+
+    if workers <= 1 or _warm_pool is not None:
+        yield
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        _warm_pool = pool
+        try:
+            yield
+        finally:
+            _warm_pool = None
+
+
+def _chunks(items: list, size: int) -> list:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def prepare_portfolio(
+    investments: list,
+    metrics: list,
+    workers: int = None,
+    window: int = 7,
+    expressions: ExpressionPlan = None,
+    masks: np.ndarray = None,
+    progress=None,
+    on_chunk=None
+):
+    """
+    Loads every investment and computes latest values and trends.
+
+    Parameters:
+    - investments: Investment dicts (from investments.json)
+    - metrics: Metric columns the rules need
+    - workers: Process count; 1 runs in-process (default PIPELINE_WORKERS).
+      An active warm_pool() is reused instead of starting a new pool
+    - window: Trend window, i.e. how many recent rows are read
+    - expressions: Plan computing derived metrics (RuleSet.expressions)
+    - masks: Optional (investments x metrics) mask (metric_masks()); only
+      masked-in metrics are loaded
+    - progress: Optional callable(done, total), called as investments
+      (in-process) or chunks (process pool) finish loading
+    - on_chunk: Optional callable(start, latest, trends, available),
+      called in input order with each chunk's results as soon as it is
+      prepared (start = position of its first investment). In-process
+      runs are then split into chunks too, so callers can show results
+      before the whole portfolio is loaded
+
+    Returns:
+    - (latest, trends, available, stats): an (investments x metrics)
+      matrix (NaN where not loaded), one {metric: trend dict} per
+      investment, an (investments x metrics) mask of the metrics
+      actually loaded, all in input order, and load/trend timings and
+      cache counters (summed over worker processes, so with workers > 1
+      the *_ms values are busy time rather than wall time)
+    """
+    workers = workers or PIPELINE_WORKERS
+    mask_rows = None if masks is None else [row.tolist() for row in masks]
+
+    total = len(investments)
+    in_process = workers <= 1 or total <= 1
+
+    if in_process and (on_chunk is None or total <= 1):
+        result = _prepare_chunk(
+            investments, metrics, window, data_loader.default_folder,
+            data_loader.BINARY_CACHE_DIR, expressions, mask_rows,
+            None if progress is None else lambda done: progress(done, total)
+        )
+        if on_chunk is not None:
+            on_chunk(0, *result[:3])
+        return result
+
+    # Several chunks per worker keeps processes busy when sizes vary
+    size = PIPELINE_CHUNK_SIZE or math.ceil(total / (max(workers, 1) * 4))
+    chunks = _chunks(investments, size)
+    mask_chunks = _chunks(mask_rows, size) if mask_rows is not None else repeat(None)
+
+    args = (
+        _prepare_chunk,
+        chunks,
+        repeat(metrics),
+        repeat(window),
+        repeat(data_loader.default_folder),
+        repeat(data_loader.BINARY_CACHE_DIR),
+        repeat(expressions),
+        mask_chunks
+    )
+
+    def collect(mapped):
+        results = []
+        done = 0
+        for chunk, result in zip(chunks, mapped):
+            results.append(result)
+            if on_chunk is not None:
+                on_chunk(done, *result[:3])
+            done += len(chunk)
+            if progress is not None:
+                progress(done, total)
+        return results
+
+    def prepare_in_process():
+        start = 0
+        for chunk, chunk_masks in zip(chunks, mask_chunks):
+            yield _prepare_chunk(
+                chunk, metrics, window, data_loader.default_folder,
+                data_loader.BINARY_CACHE_DIR, expressions, chunk_masks,
+                None if progress is None else lambda done, start=start: progress(start + done, total)
+            )
+            start += len(chunk)
+
+    # map() yields in submission order, so output order is deterministic
+    if in_process:
+        results = collect(prepare_in_process())
+    elif _warm_pool is not None:
+        results = collect(_warm_pool.map(*args))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            results = collect(pool.map(*args))
+
+    latest = np.vstack([result[0] for result in results])
+    trends = [trend for result in results for trend in result[1]]
+    available = np.vstack([result[2] for result in results])
+    stats = _merge_stats([result[3] for result in results])
+
+    return latest, trends, available, stats
@@ -1,14 +1,51 @@
+import os
 import yaml
 import pandas as pd
 import numpy as np
 import json
+import threading
+from engine.expressions import ExpressionError, compile_rule_expressions, parse_expression
 
-def load_rules():
-    with open("config/rules.yaml", "r") as f:
-        return yaml.safe_load(f)["rules"]
+RULES_PATH = "config/rules.yaml"
+INVESTMENTS_PATH = "config/investments.json"
 
-def load_investments():
-    with open("config/investments.json", "r") as f:
+# path -> [(mtime_ns, size), parsed rules, RuleSet or None]
+_rules_cache = {}
+_rules_lock = threading.Lock()
+
+
+def _rules_entry(path: str) -> list:
+    # Re-read (and later re-compile) only when the file changes
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+
+    with _rules_lock:
+        entry = _rules_cache.get(path)
+        if entry is None or entry[0] != stamp:
+            with open(path, "r") as f:
+                entry = [stamp, yaml.safe_load(f)["rules"], None]
+            _rules_cache[path] = entry
+        return entry
+
+
+def load_rules(path: str = RULES_PATH):
+    return list(_rules_entry(path)[1])
+
+
+def load_rule_set(path: str = RULES_PATH):
+    """
+    The compiled RuleSet for rules.yaml, rebuilt only when the file's
+    mtime/size change. Raises RuleConfigError for invalid rules.
+    """
+    entry = _rules_entry(path)
+
+    with _rules_lock:
+        if entry[2] is None:
+            entry[2] = RuleSet(entry[1])
+        return entry[2]
+
+def load_investments(path: str = INVESTMENTS_PATH):
+    with open(path, "r") as f:
         return json.load(f)["investments"]
 
 
@@ -72,3 +109,319 @@ def evaluate_rule(rule, df: pd.DataFrame):
     }
 
 
+# ------------------------------
+#   BATCH (PORTFOLIO) EVALUATION
+# ------------------------------
+COVENANT_SIGNS = {"maximum": 1.0, "minimum": -1.0}
+
+
+class RuleConfigError(ValueError):
+    """
+    Raised when rules.yaml (or the data it is applied to) is invalid.
+    """
+
+
+# Fields every rule needs
+REQUIRED_RULE_FIELDS = ("name", "metric", "ideal_value", "near_breach_value", "threshold_value", "covenant_type")
+
+# Optional rule 'applies_to' keys -> how to read them from an investment
+APPLIES_TO_FIELDS = {
+    "types": lambda inv: inv.get("type"),
+    "loan_types": lambda inv: (inv.get("investment_details") or {}).get("loan_type"),
+    "industries": lambda inv: (inv.get("investment_details") or {}).get("industry"),
+}
+
+
+def _as_set(values) -> frozenset:
+    if isinstance(values, str):
+        return frozenset([values.lower()])
+    return frozenset(str(v).lower() for v in values)
+
+
+def _rule_errors(position: int, rule) -> list:
+    """
+    Everything wrong with one rule, as readable messages.
+    """
+    if not isinstance(rule, dict):
+        return [f"Rule #{position + 1} is not a mapping"]
+
+    label = f"Rule '{rule.get('name', f'#{position + 1}')}'"
+    missing = [field for field in REQUIRED_RULE_FIELDS if rule.get(field) is None]
+    if missing:
+        return [f"{label} is missing {', '.join(missing)}"]
+
+    errors = []
+    covenant_type = str(rule["covenant_type"]).lower()
+    if covenant_type not in COVENANT_SIGNS:
+        errors.append(f"{label}: unsupported covenant_type '{rule['covenant_type']}'")
+
+    try:
+        ideal, near, threshold = (
+            float(rule[field]) for field in ("ideal_value", "near_breach_value", "threshold_value")
+        )
+    except (TypeError, ValueError):
+        return errors + [f"{label}: ideal/near_breach/threshold values must be numbers"]
+
+    # Values must move from ideal towards the threshold
+    if covenant_type == "maximum" and not ideal <= near <= threshold:
+        errors.append(
+            f"{label}: maximum covenant needs ideal_value <= near_breach_value"
+            f" <= threshold_value (got {ideal}, {near}, {threshold})"
+        )
+    elif covenant_type == "minimum" and not ideal >= near >= threshold:
+        errors.append(
+            f"{label}: minimum covenant needs ideal_value >= near_breach_value"
+            f" >= threshold_value (got {ideal}, {near}, {threshold})"
+        )
+
+    if rule.get("expression"):
+        try:
+            parse_expression(rule["expression"])
+        except ExpressionError as e:
+            errors.append(f"{label}: {e}")
+
+    applies_to = rule.get("applies_to")
+    if applies_to is not None:
+        if not isinstance(applies_to, dict):
+            errors.append(f"{label}: applies_to must be a mapping")
+        else:
+            unknown = [key for key in applies_to if key not in APPLIES_TO_FIELDS]
+            if unknown:
+                errors.append(
+                    f"{label}: unknown applies_to key(s) {unknown}"
+                    f" (expected {', '.join(APPLIES_TO_FIELDS)})"
+                )
+            for key, values in applies_to.items():
+                if not isinstance(values, (str, list)) or not values:
+                    errors.append(f"{label}: applies_to {key} must be a name or a list of names")
+
+    return errors
+
+
+class RuleSet:
+    """
+    Rules compiled once into arrays for evaluate_rules_batch.
+
+    Minimum covenants are negated (sign = -1) so that every rule can be
+    checked as a maximum covenant:
+      breached    : sign * value >  sign * threshold
+      near breach : sign * value >  sign * near_breach  (and not breached)
+      ideal       : sign * value <= sign * ideal
+    """
+
+    __slots__ = (
+        "rules", "metrics", "metric_index", "column", "covenant_type",
+        "sign", "ideal", "near", "threshold",
+        "signed_ideal", "signed_near", "signed_threshold",
+        "expressions", "source_columns", "static",
+        "rule_columns", "applies_to", "_attribute_masks", "_column_masks",
+    )
+
+    def __init__(self, rules: list):
+        errors = [error for i, rule in enumerate(rules) for error in _rule_errors(i, rule)]
+        if errors:
+            raise RuleConfigError("Invalid rules:\n  - " + "\n  - ".join(errors))
+
+        self.rules = list(rules)
+
+        # metric -> column of the latest-values matrix
+        self.metric_index = {}
+        for rule in self.rules:
+            self.metric_index.setdefault(rule["metric"], len(self.metric_index))
+        self.metrics = list(self.metric_index)
+        self.column = np.array([self.metric_index[r["metric"]] for r in self.rules], dtype=int)
+
+        self.covenant_type = [str(r["covenant_type"]).lower() for r in self.rules]
+        self.sign = np.array([COVENANT_SIGNS[c] for c in self.covenant_type])
+        self.ideal = np.array([float(r["ideal_value"]) for r in self.rules])
+        self.near = np.array([float(r["near_breach_value"]) for r in self.rules])
+        self.threshold = np.array([float(r["threshold_value"]) for r in self.rules])
+        self.signed_ideal = self.sign * self.ideal
+        self.signed_near = self.sign * self.near
+        self.signed_threshold = self.sign * self.threshold
+
+        # Derived metrics ('expression' rules) share one plan per run
+        try:
+            self.expressions = compile_rule_expressions(self.rules)
+        except ExpressionError as e:
+            raise RuleConfigError(str(e)) from e
+
+        # Columns a data source must provide
+        self.source_columns = self.expressions.source_columns(self.metrics)
+
+        # Applicability: source columns and investment filters per rule
+        self.rule_columns = [self.expressions.metric_columns(r["metric"]) for r in self.rules]
+        self.applies_to = [
+            {key: _as_set(values) for key, values in (r.get("applies_to") or {}).items()}
+            for r in self.rules
+        ]
+        self._attribute_masks = {}
+        self._column_masks = {}
+
+        # Per-rule parts of the result dicts, identical for every investment
+        self.static = [
+            {
+                "metric": rule["metric"],
+                "ideal_value": ideal,
+                "near_breach_value": near,
+                "threshold_value": threshold,
+                "covenant_type": covenant_type,
+                "severity": rule.get("severity", "unknown"),
+                "name": rule["name"],
+            }
+            for rule, ideal, near, threshold, covenant_type in zip(
+                self.rules,
+                self.ideal.tolist(),
+                self.near.tolist(),
+                self.threshold.tolist(),
+                self.covenant_type,
+            )
+        ]
+
+    def __len__(self):
+        return len(self.rules)
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def attribute_mask(self, investment: dict) -> np.ndarray:
+        """
+        Rules whose applies_to matches the investment's type, loan type
+        and industry. Memoized per distinct combination.
+        """
+        key = tuple(
+            str(read(investment)).lower() for read in APPLIES_TO_FIELDS.values()
+        )
+        mask = self._attribute_masks.get(key)
+
+        if mask is None:
+            values = dict(zip(APPLIES_TO_FIELDS, key))
+            mask = np.array([
+                all(values[field] in allowed for field, allowed in applies_to.items())
+                for applies_to in self.applies_to
+            ], dtype=bool)
+            self._attribute_masks[key] = mask
+
+        return mask
+
+    def column_mask(self, columns) -> np.ndarray:
+        """
+        Rules whose metric can be read or computed from `columns`.
+        Memoized per distinct column set (one per source schema).
+        """
+        key = frozenset(columns)
+        mask = self._column_masks.get(key)
+
+        if mask is None:
+            mask = np.array([needed <= key for needed in self.rule_columns], dtype=bool)
+            self._column_masks[key] = mask
+
+        return mask
+
+    def evaluate(self, df: pd.DataFrame) -> list:
+        """
+        evaluate_rule for every rule against one DataFrame.
+        """
+        frame = self.expressions.apply(df)
+        return evaluate_rules_batch(self, latest_values_matrix([frame], self.metrics))[0]
+
+
+def compile_rules(rules) -> RuleSet:
+    """
+    Validates and compiles rules; a RuleSet is returned unchanged.
+    Raises RuleConfigError listing every invalid rule.
+    """
+    if isinstance(rules, RuleSet):
+        return rules
+    return RuleSet(rules)
+
+
+def latest_values_matrix(frames, metrics, allow_missing: bool = False) -> np.ndarray:
+    """
+    Stacks the latest value of each metric for every DataFrame into an
+    (investments x metrics) float matrix. With allow_missing, absent
+    columns (and empty frames) give NaN instead of a ValueError.
+    """
+    latest = np.full((len(frames), len(metrics)), np.nan)
+
+    for i, df in enumerate(frames):
+        present = []
+        for j, metric in enumerate(metrics):
+            if metric in df.columns:
+                present.append(j)
+            elif not allow_missing:
+                raise ValueError(f"Column '{metric}' not found in DataFrame")
+
+        if present and len(df):
+            latest[i, present] = df[[metrics[j] for j in present]].iloc[-1].to_numpy(dtype=float)
+
+    return latest
+
+
+def evaluate_rules_flags(compiled: RuleSet, latest: np.ndarray):
+    """
+    Vectorized covenant checks for the whole portfolio.
+
+    Returns (values, breached, near_breach, ideal_state), each an
+    (investments x rules) array.
+    """
+    values = latest[:, compiled.column]
+    signed = values * compiled.sign
+
+    breached = signed > compiled.signed_threshold
+    near_breach = (signed > compiled.signed_near) & ~breached
+    ideal_state = signed <= compiled.signed_ideal
+
+    return values, breached, near_breach, ideal_state
+
+
+def evaluate_rules_batch(compiled: RuleSet, latest: np.ndarray, applicable: np.ndarray = None) -> list:
+    """
+    Evaluates every compiled rule against every investment at once.
+
+    Parameters:
+    - compiled: RuleSet from compile_rules
+    - latest: (investments x compiled.metrics) matrix of latest values
+    - applicable: Optional (investments x rules) mask; skipped pairs get
+      None instead of a result
+
+    Returns:
+    - One list per investment of evaluate_rule-style result dicts; None
+      for skipped pairs and for metrics without a latest value (NaN,
+      e.g. an empty source), whose flags would otherwise all be False
+    """
+    values, breached, near_breach, ideal_state = evaluate_rules_flags(compiled, latest)
+    static = compiled.static
+
+    if applicable is None:
+        applicable = np.ones(values.shape, dtype=bool)
+    applicable = applicable & ~np.isnan(values)
+
+    results = []
+    for row in zip(
+        values.tolist(),
+        ideal_state.tolist(),
+        near_breach.tolist(),
+        breached.tolist(),
+        applicable.tolist(),
+    ):
+        results.append([
+            {
+                "metric": fixed["metric"],
+                "value": value,
+                "current_value": value,
+                "ideal_value": fixed["ideal_value"],
+                "near_breach_value": fixed["near_breach_value"],
+                "threshold_value": fixed["threshold_value"],
+                "limit": fixed["threshold_value"],
+                "covenant_type": fixed["covenant_type"],
+                "ideal_state": is_ideal,
+                "near_breach": is_near,
+                "breached": is_breached,
+                "severity": fixed["severity"],
+                "name": fixed["name"],
+            } if applies else None
+            for fixed, value, is_ideal, is_near, is_breached, applies in zip(static, *row)
+        ])
+
+    return results
@@ -1,28 +1,336 @@
-import schedule
-import time
-from engine.data_loader import load_metrics
-from engine.rule_engine import load_rules, evaluate_rule
-from engine.alert_engine import classify_alert
-from engine.llm_explainer import generate_explanation
-
-def run_all_checks():
-    df = load_metrics()
-    rules = load_rules()
-
-    alerts = []
-
-    for rule in rules:
-        result = evaluate_rule(rule, df)
-        status = classify_alert(result)
-        if status != "OK":
-            explanation = generate_explanation(result)
-            alerts.append({"status": status, "result": result, "explanation": explanation})
-
-    print("Alerts:", alerts)
-    return alerts
-
-def start_scheduler():
-    schedule.every().day.at("09:00").do(run_all_checks)
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+import os
+import signal
+import threading
+import traceback
+import yaml
+from collections import deque
+from datetime import datetime, timedelta
+from engine.portfolio import warm_pool
+from engine.rule_engine import load_rule_set, load_investments, APPLIES_TO_FIELDS
+
+# YAML file listing the monitoring jobs and their schedules
+SCHEDULE_PATH = os.getenv("SCHEDULE_PATH", "config/schedule.yaml")
+
+# Worker processes kept alive between scheduled runs (1 = in-process)
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "1"))
+
+OVERLAP_POLICIES = ("skip", "queue")
+
+
+# ---------------------------
+# Cron expressions
+# ---------------------------
+# Standard 5 fields: minute hour day-of-month month day-of-week
+# (0 or 7 = Sunday). Each field: '*', 'a', 'a-b', lists 'a,b' and
+# steps '*/n' / 'a-b/n'.
+_CRON_FIELDS = (("minute", 0, 59), ("hour", 0, 23), ("day", 1, 31), ("month", 1, 12), ("weekday", 0, 7))
+
+
+def _parse_cron_field(text: str, low: int, high: int) -> frozenset:
+    values = set()
+
+    for part in text.split(","):
+        base, _, step = part.partition("/")
+        step = int(step) if step else 1
+
+        if base == "*":
+            start, end = low, high
+        elif "-" in base:
+            start, end = (int(v) for v in base.split("-", 1))
+        else:
+            start = end = int(base)
+            if step > 1:
+                end = high
+
+        if not low <= start <= end <= high or step < 1:
+            raise ValueError(f"Cron field '{text}' out of range {low}-{high}")
+
+        values.update(range(start, end + 1, step))
+
+    return frozenset(values)
+
+
+class CronSchedule:
+    """
+    A parsed 5-field cron expression that can compute its next due time.
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression '{expression}' needs 5 fields")
+
+        try:
+            parsed = [
+                _parse_cron_field(text, low, high)
+                for text, (_, low, high) in zip(fields, _CRON_FIELDS)
+            ]
+        except ValueError as e:
+            raise ValueError(f"Invalid cron expression '{expression}': {e}") from None
+
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        # cron: 0 and 7 are Sunday; Python: Monday = 0 ... Sunday = 6
+        self.weekdays = frozenset((d - 1) % 7 for d in weekdays)
+
+        # Like cron, a restricted day-of-month OR day-of-week matches
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = moment.weekday() in self.weekdays
+
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        """
+        First due time strictly after `moment` (minute resolution).
+        """
+        t = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+
+        # Skip whole months/days/hours that can't match
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(t):
+                t = (t + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if t.hour not in self.hours:
+                t = (t + timedelta(hours=1)).replace(minute=0)
+                continue
+            if t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+                continue
+            return t
+
+        raise ValueError(f"Cron expression '{self.expression}' never fires")
+
+
+# ---------------------------
+# Jobs
+# ---------------------------
+class MonitoringJob:
+    """
+    One entry of schedule.yaml: an investment group checked on a cadence.
+    """
+
+    def __init__(self, config: dict):
+        self.name = config.get("name")
+        if not self.name:
+            raise ValueError("Scheduled job is missing 'name'")
+
+        if "cron" not in config:
+            raise ValueError(f"Job '{self.name}' is missing 'cron'")
+        self.schedule = CronSchedule(str(config["cron"]))
+
+        self.overlap = config.get("overlap", "skip")
+        if self.overlap not in OVERLAP_POLICIES:
+            raise ValueError(f"Job '{self.name}': overlap must be one of {OVERLAP_POLICIES}")
+
+        self.incremental = bool(config.get("incremental", True))
+        self.workers = config.get("workers")
+
+        # Group filter: ids plus the same fields rules' applies_to uses
+        group = config.get("investments") or {}
+        unknown = [k for k in group if k != "ids" and k not in APPLIES_TO_FIELDS]
+        if unknown:
+            raise ValueError(f"Job '{self.name}': unknown investments filter(s) {unknown}")
+
+        self.ids = {str(i) for i in group["ids"]} if "ids" in group else None
+        self.filters = {
+            key: {str(v).lower() for v in values}
+            for key, values in group.items() if key != "ids"
+        }
+
+        self.next_due = None
+
+    def select(self, investments: list) -> list:
+        """
+        The investments in this job's group, in portfolio order.
+        """
+        selected = []
+        for inv in investments:
+            if self.ids is not None and str(inv["id"]) not in self.ids:
+                continue
+            if all(
+                str(APPLIES_TO_FIELDS[key](inv)).lower() in allowed
+                for key, allowed in self.filters.items()
+            ):
+                selected.append(inv)
+        return selected
+
+
+def load_schedule(path: str = SCHEDULE_PATH) -> list:
+    with open(path, "r") as f:
+        config = yaml.safe_load(f) or {}
+
+    jobs = [MonitoringJob(job) for job in config.get("jobs", [])]
+
+    names = [job.name for job in jobs]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate job name(s): {sorted(duplicates)}")
+
+    return jobs
+
+
+def _log(message: str):
+    print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] {message}")
+
+
+# ---------------------------
+# Scheduler
+# ---------------------------
+class MonitoringScheduler:
+    """
+    Runs monitoring jobs when due, one pipeline run at a time.
+
+    The scheduler thread sleeps until the next due job (no polling);
+    a single long-lived runner thread executes runs, so the process-wide
+    source cache, SQLite connections, compiled rules and (optionally) a
+    worker pool stay warm between runs. A job that comes due while a run
+    is active or queued is skipped or queued according to its
+    'overlap' policy; a job is never queued twice.
+    """
+
+    def __init__(self, jobs: list, workers: int = None):
+        self.jobs = jobs
+        self.workers = workers or SCHEDULER_WORKERS
+        self.stop_event = threading.Event()
+
+        self.pending = deque()
+        self.running = None
+        self.condition = threading.Condition()
+        self.history = []
+
+    # --- dispatch -------------------------------------------------------
+    def dispatch(self, job: MonitoringJob):
+        """
+        Hands a due job to the runner, applying its overlap policy.
+        """
+        with self.condition:
+            busy = self.running is not None or self.pending
+
+            if job in self.pending:
+                _log(f"{job.name}: already queued, coalescing")
+                return False
+
+            if busy and job.overlap == "skip":
+                _log(f"{job.name}: skipped, '{self.running.name if self.running else self.pending[0].name}' still in progress")
+                return False
+
+            self.pending.append(job)
+            self.condition.notify()
+            return True
+
+    def _runner(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stop_event.is_set():
+                    self.condition.wait()
+                if self.stop_event.is_set():
+                    return
+                self.running = self.pending.popleft()
+
+            try:
+                self.run_job(self.running)
+            finally:
+                with self.condition:
+                    self.running = None
+
+    def run_job(self, job: MonitoringJob) -> dict:
+        # Imported here so loading the schedule doesn't pull in the LLM client
+        from main import check_breached_covenant
+
+        started = datetime.now()
+        result = {"job": job.name, "started_at": started.strftime("%Y-%m-%d %H:%M:%S")}
+
+        try:
+            # Both reuse their cached copies unless the files changed
+            rule_set = load_rule_set()
+            investments = job.select(load_investments())
+
+            report = check_breached_covenant(
+                investments, rule_set,
+                workers=job.workers or self.workers,
+                incremental=job.incremental
+            )
+            result["run_id"] = report.get("run_id")
+            result["summary"] = report["summary"]
+            _log(
+                f"{job.name}: {len(investments)} investments,"
+                f" {report['summary']['total_breaches']} breaches,"
+                f" {report['summary']['total_near_breaches']} near breaches"
+                f" (run {report.get('run_id')})"
+            )
+        except Exception as e:
+            result["error"] = str(e)
+            _log(f"{job.name}: run failed: {e}")
+            traceback.print_exc()
+
+        result["seconds"] = round((datetime.now() - started).total_seconds(), 3)
+        self.history.append(result)
+        del self.history[:-100]
+        return result
+
+    # --- main loop ------------------------------------------------------
+    def run_forever(self, now=datetime.now):
+        if not self.jobs:
+            _log("No scheduled jobs configured")
+            return
+
+        start = now()
+        for job in self.jobs:
+            job.next_due = job.schedule.next_after(start)
+            _log(f"{job.name}: '{job.schedule.expression}', next run {job.next_due}")
+
+        runner = threading.Thread(target=self._runner, name="monitoring-runner", daemon=True)
+        runner.start()
+
+        with warm_pool(self.workers):
+            while not self.stop_event.is_set():
+                next_job = min(self.jobs, key=lambda job: job.next_due)
+                delay = (next_job.next_due - now()).total_seconds()
+
+                # Sleep until the next due time; stop() wakes us early
+                if delay > 0 and self.stop_event.wait(delay):
+                    break
+
+                current = now()
+                for job in self.jobs:
+                    if job.next_due <= current:
+                        self.dispatch(job)
+                        job.next_due = job.schedule.next_after(current)
+
+            self.stop()
+            runner.join()
+
+    def stop(self):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+
+
+def start_scheduler(path: str = SCHEDULE_PATH, workers: int = None):
+    """
+    Runs the monitoring daemon until SIGINT/SIGTERM.
+    """
+    scheduler = MonitoringScheduler(load_schedule(path), workers)
+
+    def _shutdown(signum, frame):
+        _log("Stopping scheduler after the current run")
+        scheduler.stop()
+
+    signal.signal(signal.SIGINT, _shutdown)
+    signal.signal(signal.SIGTERM, _shutdown)
+
+    scheduler.run_forever()
+
+
+if __name__ == "__main__":
+    start_scheduler()
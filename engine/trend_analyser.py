@@ -1,6 +1,14 @@
 import pandas as pd
 import numpy as np
 
+# Trend / confidence cut-offs
+SLOPE_THRESHOLD = 0.001
+STD_HIGH_CONFIDENCE = 0.02
+STD_MEDIUM_CONFIDENCE = 0.05
+
+# Batched results this close to a cut-off are recomputed the slow way
+_EXACT_TOLERANCE = 1e-9
+
 
 def analyze_trend(
     df: pd.DataFrame,
@@ -53,20 +61,52 @@ def analyze_trend(
     x = np.arange(len(values))
     slope = np.polyfit(x, values, 1)[0]
 
+    # Confidence based on consistency
+    value_std = np.std(values)
+
+    return _classify_trend(slope, rate_of_change, value_std)
+
+
+# ---------------------------
+# Batched trend analysis
+# ---------------------------
+def _trend_stats(values: np.ndarray):
+    """
+    Closed-form least-squares slope, rate of change (%) and std over the
+    points axis of `values` (shape [..., points, metrics]).
+
+    With x = 0..n-1 the fitted slope is sum((x - mean_x) * y) / sum((x - mean_x)^2),
+    which is what np.polyfit(x, y, 1) computes, without one fit per series.
+    """
+    n = values.shape[-2]
+    x = np.arange(n) - (n - 1) / 2
+    weights = x / (x @ x)
+
+    slope = np.einsum("n,...nm->...m", weights, values)
+
+    start = values[..., 0, :]
+    end = values[..., -1, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.where(start == 0, 0.0, (end - start) / start * 100)
+
+    std = values.std(axis=-2)
+
+    return slope, rate, std
+
+
+def _classify_trend(slope, rate_of_change, value_std) -> dict:
     # Determine trend direction
-    if slope < -0.001:
+    if slope < -SLOPE_THRESHOLD:
         trend = "deteriorating"
-    elif slope > 0.001:
+    elif slope > SLOPE_THRESHOLD:
         trend = "improving"
     else:
         trend = "stable"
 
     # Confidence based on consistency
-    value_std = np.std(values)
-
-    if value_std < 0.02:
+    if value_std < STD_HIGH_CONFIDENCE:
         confidence = "high"
-    elif value_std < 0.05:
+    elif value_std < STD_MEDIUM_CONFIDENCE:
         confidence = "medium"
     else:
         confidence = "low"
@@ -76,3 +116,104 @@ def analyze_trend(
         "rate_of_change": round(rate_of_change, 2),
         "confidence": confidence
     }
+
+
+def _exact_near_cutoffs(values: np.ndarray, slope, value_std):
+    """
+    The closed-form slope and axis-wise std can differ from np.polyfit /
+    np.std in the last bits. Where that could flip a classification
+    (e.g. data rounded to 2 decimals giving a slope of exactly 0.001),
+    recompute exactly as analyze_trend does so results stay identical.
+    """
+    if abs(abs(slope) - SLOPE_THRESHOLD) < _EXACT_TOLERANCE:
+        slope = np.polyfit(np.arange(len(values)), values, 1)[0]
+
+    if (
+        abs(value_std - STD_HIGH_CONFIDENCE) < _EXACT_TOLERANCE
+        or abs(value_std - STD_MEDIUM_CONFIDENCE) < _EXACT_TOLERANCE
+    ):
+        value_std = np.std(values)
+
+    return slope, value_std
+
+
+def analyze_trends_batch(
+    frames: list,
+    metrics: list,
+    window: int = 7
+) -> list:
+    """
+    Batched equivalent of analyze_trend for many metrics and investments.
+
+    Parameters:
+    - frames: One DataFrame per investment
+    - metrics: Column names to analyze in every frame
+    - window: Number of recent data points to consider
+
+    Returns:
+    - One {metric: trend dict} per frame, matching analyze_trend
+    """
+    results = [dict.fromkeys(metrics) for _ in frames]
+
+    # Group (frame, metric) series by tail length so each group is one array op
+    groups = {}
+    for i, df in enumerate(frames):
+        present = [m for m in metrics if m in df.columns]
+
+        for metric in metrics:
+            if metric not in df.columns:
+                results[i][metric] = {
+                    "trend": "unknown",
+                    "rate_of_change": 0.0,
+                    "confidence": "low"
+                }
+
+        if not present:
+            continue
+
+        points = min(window, len(df))
+
+        if points < 3:
+            for metric in present:
+                results[i][metric] = {
+                    "trend": "stable",
+                    "rate_of_change": 0.0,
+                    "confidence": "low"
+                }
+            continue
+
+        # Slice the column arrays directly, much cheaper than df.tail()[cols]
+        values = np.empty((points, len(present)))
+        for col, metric in enumerate(present):
+            values[:, col] = df[metric].to_numpy()[-points:]
+
+        groups.setdefault((points, tuple(present)), []).append((i, values))
+
+    for (_, present), members in groups.items():
+        stacked = np.stack([values for _, values in members])
+        slope, rate, std = _trend_stats(stacked)
+
+        for row, (i, values) in enumerate(members):
+            for col, metric in enumerate(present):
+                series_slope, series_std = _exact_near_cutoffs(
+                    values[:, col], slope[row, col], std[row, col]
+                )
+                results[i][metric] = _classify_trend(
+                    series_slope, rate[row, col], series_std
+                )
+
+    return results
+
+
+def analyze_trends(
+    df: pd.DataFrame,
+    metrics: list,
+    window: int = 7
+) -> dict:
+    """
+    Analyzes several metric columns of one DataFrame at once.
+
+    Returns:
+    - {metric: trend dict}, matching analyze_trend for each metric
+    """
+    return analyze_trends_batch([df], metrics, window)[0]
@@ -0,0 +1,274 @@
+import os
+import signal
+import threading
+import time
+import traceback
+from pathlib import Path
+from datetime import datetime
+from engine import data_loader
+from engine.rule_engine import RULES_PATH, INVESTMENTS_PATH, load_rule_set, load_investments
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # falls back to polling
+    Observer = None
+    FileSystemEventHandler = object
+
+# Changes are batched until the folder is quiet for the debounce, at most
+# the max delay; polling is the fallback when no OS watcher is available
+WATCH_DEBOUNCE_SECONDS = float(os.getenv("WATCH_DEBOUNCE_SECONDS", "2"))
+WATCH_MAX_DELAY_SECONDS = float(os.getenv("WATCH_MAX_DELAY_SECONDS", "10"))
+WATCH_POLL_SECONDS = float(os.getenv("WATCH_POLL_SECONDS", "2"))
+WATCH_POLLING = os.getenv("WATCH_POLLING", "0") == "1"
+
+# SQLite side files belong to their database
+_SIDE_SUFFIXES = ("-wal", "-shm", "-journal")
+
+
+def _normalize(path) -> str:
+    path = os.path.realpath(path)
+    for suffix in _SIDE_SUFFIXES:
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return path
+
+
+def _log(message: str):
+    print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] {message}")
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type in ("opened", "closed_no_write"):
+            return
+        self.watcher.notify(event.src_path)
+        # Atomic saves (write temp file, rename over) report the target here
+        if getattr(event, "dest_path", None):
+            self.watcher.notify(event.dest_path)
+
+
+class PipelineWatcher:
+    """
+    Re-evaluates investments when their files change.
+
+    Changes under the data folder re-check only the investments whose
+    data source is the changed file; a changed rules.yaml or
+    investments.json re-checks what it affects through the incremental
+    fingerprints. Bursts of writes are debounced: a batch runs once no
+    new change arrived for `debounce` seconds, or after `max_delay`.
+
+    Uses watchdog (inotify/FSEvents/...) when installed, otherwise polls
+    file mtimes/sizes every `poll_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        data_folder: str = None,
+        debounce: float = WATCH_DEBOUNCE_SECONDS,
+        max_delay: float = WATCH_MAX_DELAY_SECONDS,
+        poll_interval: float = WATCH_POLL_SECONDS,
+        polling: bool = WATCH_POLLING,
+        workers: int = None
+    ):
+        self.data_folder = _normalize(data_folder or data_loader.default_folder)
+        self.config_files = {_normalize(RULES_PATH), _normalize(INVESTMENTS_PATH)}
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.polling = polling or Observer is None
+        self.workers = workers
+
+        self.stop_event = threading.Event()
+        self.changed_event = threading.Event()
+        self.lock = threading.Lock()
+        self.changes = set()
+        self.last_change = 0.0
+        self.history = []
+
+    # --- change sources -------------------------------------------------
+    def _relevant(self, path: str) -> bool:
+        return path in self.config_files or path.startswith(self.data_folder + os.sep)
+
+    def notify(self, path):
+        path = _normalize(path)
+        if not self._relevant(path):
+            return
+
+        with self.lock:
+            self.changes.add(path)
+            self.last_change = time.monotonic()
+        self.changed_event.set()
+
+    def _snapshot(self) -> dict:
+        snapshot = {}
+        paths = [Path(p) for p in self.config_files]
+        if os.path.isdir(self.data_folder):
+            paths += [p for p in Path(self.data_folder).rglob("*") if p.is_file()]
+
+        for path in paths:
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            snapshot[str(path)] = (stat.st_mtime_ns, stat.st_size)
+
+        return snapshot
+
+    def _poll(self):
+        previous = self._snapshot()
+
+        while not self.stop_event.wait(self.poll_interval):
+            current = self._snapshot()
+            for path in current.keys() | previous.keys():
+                if current.get(path) != previous.get(path):
+                    self.notify(path)
+            previous = current
+
+    def _start_source(self):
+        if self.polling:
+            _log(f"Watching {self.data_folder} by polling every {self.poll_interval}s")
+            thread = threading.Thread(target=self._poll, name="watch-poll", daemon=True)
+            thread.start()
+            return None
+
+        observer = Observer()
+        handler = _EventHandler(self)
+        if os.path.isdir(self.data_folder):
+            observer.schedule(handler, self.data_folder, recursive=True)
+        # Watch config directories: editors often replace files on save
+        for directory in {os.path.dirname(path) for path in self.config_files}:
+            observer.schedule(handler, directory, recursive=False)
+        observer.start()
+        _log(f"Watching {self.data_folder} and config files for changes")
+        return observer
+
+    # --- batches --------------------------------------------------------
+    def _next_batch(self) -> set:
+        """
+        Waits for a change, then for the burst to settle. Returns the
+        changed paths, or an empty set when stopping.
+        """
+        while not self.changed_event.wait(0.5):
+            if self.stop_event.is_set():
+                return set()
+
+        started = time.monotonic()
+        while not self.stop_event.is_set():
+            with self.lock:
+                quiet_for = time.monotonic() - self.last_change
+            waited = time.monotonic() - started
+
+            if quiet_for >= self.debounce or waited >= self.max_delay:
+                break
+            self.stop_event.wait(min(self.debounce - quiet_for, self.max_delay - waited))
+
+        with self.lock:
+            batch = self.changes
+            self.changes = set()
+            self.changed_event.clear()
+
+        return batch
+
+    def affected_investments(self, investments: list, paths: set):
+        """
+        Ids whose data source is one of `paths`, or None when a config
+        file changed (the incremental fingerprints decide then).
+        """
+        if paths & self.config_files:
+            return None
+
+        affected = set()
+        for inv in investments:
+            ds = inv.get("data_source", {})
+            if ds.get("type") not in ("csv", "excel", "sqlite") or not ds.get("path"):
+                continue
+            if _normalize(data_loader.default_folder + ds["path"]) in paths:
+                affected.add(str(inv["id"]))
+
+        return affected
+
+    def process(self, paths: set) -> dict:
+        # Imported here so starting the watcher doesn't pull in the LLM client
+        from main import check_breached_covenant
+
+        started = time.monotonic()
+        result = {"changed": sorted(paths)}
+
+        try:
+            investments = load_investments()
+            recheck = self.affected_investments(investments, paths)
+
+            if recheck is not None and not recheck:
+                _log(f"{len(paths)} changed file(s) match no investment, nothing to do")
+                result["skipped"] = True
+                return result
+
+            report = check_breached_covenant(
+                investments, load_rule_set(),
+                workers=self.workers,
+                incremental=True,
+                recheck=recheck
+            )
+            summary = report["summary"]
+            result["run_id"] = report.get("run_id")
+            result["rechecked"] = summary["total_investments"] - summary["carried_forward"]
+            _log(
+                f"Re-checked {result['rechecked']} investment(s) after"
+                f" {len(paths)} change(s): {summary['total_breaches']} breaches,"
+                f" {summary['total_near_breaches']} near breaches (run {result['run_id']})"
+            )
+        except Exception as e:
+            result["error"] = str(e)
+            _log(f"Re-evaluation failed: {e}")
+            traceback.print_exc()
+        finally:
+            result["seconds"] = round(time.monotonic() - started, 3)
+            self.history.append(result)
+            del self.history[:-100]
+
+        return result
+
+    def run_forever(self, catch_up: bool = True):
+        observer = self._start_source()
+
+        try:
+            if catch_up:
+                # Pick up whatever changed while nothing was watching
+                self.process(set(self.config_files))
+
+            while not self.stop_event.is_set():
+                batch = self._next_batch()
+                if batch:
+                    self.process(batch)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+    def stop(self):
+        self.stop_event.set()
+        self.changed_event.set()
+
+
+def start_watcher(**options):
+    """
+    Runs the file-watch mode until SIGINT/SIGTERM.
+    """
+    watcher = PipelineWatcher(**options)
+
+    def _shutdown(signum, frame):
+        _log("Stopping watcher")
+        watcher.stop()
+
+    signal.signal(signal.SIGINT, _shutdown)
+    signal.signal(signal.SIGTERM, _shutdown)
+
+    watcher.run_forever()
+
+
+if __name__ == "__main__":
+    start_watcher()
@@ -1,41 +1,237 @@
-import time
 import os
-import json 
-from datetime import datetime
-from engine.data_loader import load_data_from_investment
+import threading
+import numpy as np
 from engine.alert_engine import generate_alert
-from engine.llm_explainer import generate_explanation
-from engine.rule_engine import load_rules, load_investments, evaluate_rule
+from engine.portfolio import prepare_portfolio, applicability_matrix, metric_masks, missing_columns
+from engine.explanation_stage import explain_alerts, prioritize_alerts
+from engine.history_store import save_report, save_explanations, load_report
+from engine.instrumentation import RunMetrics, profiled
+from engine.incremental import (
+    rules_fingerprint,
+    investment_fingerprint,
+    load_previous_report,
+    find_unchanged,
+)
+from engine.rule_engine import (
+    load_rules,
+    load_investments,
+    compile_rules,
+    evaluate_rules_batch,
+)
 
-def check_breached_covenant(investments, rules):
-    final_report = {
-        "summary": {
-            "total_investments": 0,
-            "total_breaches": 0,
-            "total_near_breaches": 0,
-            "total_ideal": 0
-        },
-        "investments": []
+# When explanations are produced:
+# - now: after the results are stored, before returning
+# - deferred: on a background thread; results return immediately
+# - skip: not at all (explain_run() can fill them in later)
+EXPLAIN_MODE = os.getenv("EXPLAIN_MODE", "now")
+EXPLAIN_MODES = ("now", "deferred", "skip")
+
+# Deferred explanation threads still running
+_deferred = []
+
+def check_breached_covenant(
+    investments,
+    rules,
+    workers=None,
+    incremental=False,
+    recheck=None,
+    profile=None,
+    explain_options=None,
+    progress=None,
+    explain_mode=None
+):
+    """
+    Runs the covenant monitoring pipeline over all investments.
+
+    rules may be a list of rule dicts or a RuleSet (load_rule_set()).
+    Rules whose applies_to doesn't match an investment are skipped
+    silently; rules that match but whose metric columns its data source
+    lacks are listed in summary["missing_columns"], and those whose
+    latest value is blank or not a number in summary["missing_values"].
+
+    workers > 1 loads and prepares investments in a process pool
+    (default PIPELINE_WORKERS); report order and totals do not depend
+    on it.
+
+    incremental=True re-checks only investments whose data source or
+    config changed since the last stored report (and only if the
+    rule set is unchanged); other results are carried forward as-is.
+    recheck optionally names investment ids known to have changed (see
+    find_unchanged); the file watcher uses it so API sources aren't
+    re-fetched when an unrelated file lands.
+
+    Every report carries run metrics: summary["metrics"] (stage timings
+    and counters, stored with the run) and report["investment_metrics"]
+    (per-investment load time and rows). profile=True (default
+    PIPELINE_PROFILE) also saves a cProfile of the run, and
+    METRICS_EXPORT_PATH exports the metrics in Prometheus text format.
+
+    Reporting is two-phase: the rule/trend results, summary totals and
+    history entry are stored before any LLM call, then explanations for
+    non-ok alerts (critical first) are patched into the stored run.
+    explain_mode ("now", "deferred" or "skip", default EXPLAIN_MODE)
+    decides whether that happens before returning, on a background
+    thread (see wait_for_explanations), or not at all (explain_run).
+    explain_options are passed to explain_alerts (e.g. a time_budget, or
+    a stub explain_fn for benchmarks, which bypasses the cache).
+
+    progress is an optional callable(stage, info) for callers that show
+    a run while it happens (see engine.background):
+    - ("prepare", {"done", "total"}) as investments finish loading
+    - ("prepare", {"entries"}) with finished report entries (without
+      explanations) as each chunk of investments is evaluated;
+      carried-forward entries come first. Only sent when progress is
+      given, as in-process runs are then prepared in chunks
+    - ("results", {"report"}) once every investment is evaluated; the
+      report is complete except for explanations, which are then
+      written into its alerts in place
+    - ("explain", {"done", "total"}) as explanations arrive
+    """
+    explain_mode = explain_mode or EXPLAIN_MODE
+    if explain_mode not in EXPLAIN_MODES:
+        raise ValueError(f"explain_mode must be one of {EXPLAIN_MODES}, got '{explain_mode}'")
+
+    stream = progress is not None
+    progress = progress or (lambda stage, info: None)
+    explain_options = explain_options or {}
+    metrics = RunMetrics()
+
+    with profiled(metrics, profile):
+        final_report = _run_pipeline(
+            investments, rules, workers, incremental, recheck, metrics, progress, stream
+        )
+
+        if explain_mode == "now":
+            _explain_report(final_report, metrics, explain_options, progress)
+
+    if explain_mode == "deferred":
+        thread = threading.Thread(
+            target=_explain_deferred,
+            args=(final_report, metrics, explain_options, progress),
+            name=f"explain-run-{final_report['run_id']}"
+        )
+        _deferred[:] = [t for t in _deferred if t.is_alive()] + [thread]
+        thread.start()
+    else:
+        metrics.export()
+
+    return final_report
+
+
+def pending_explanations(report: dict) -> list:
+    """
+    Non-ok alerts of a report that have no explanation yet, critical
+    first. Includes carried-forward alerts a previous run left pending.
+    """
+    return prioritize_alerts([
+        alert
+        for inv in report["investments"]
+        for alert in inv["alerts"]
+        if alert["severity"] != "ok" and "explanation" not in alert
+    ])
+
+
+def _explain_report(report, metrics, explain_options, progress):
+    """
+    Phase two: explains the report's pending alerts in place and patches
+    them (and the updated summary) into the stored run. metrics=None
+    keeps the stored run metrics as they are.
+    """
+    pending = pending_explanations(report)
+    owner = {id(alert): inv["id"] for inv in report["investments"] for alert in inv["alerts"]}
+    keep_metrics = metrics is None
+    metrics = metrics or RunMetrics()
+
+    # Explanation stage: concurrent, rate limited, retried on 429
+    with metrics.stage("explain"):
+        explanation_stats = explain_alerts(
+            pending,
+            groups=[owner[id(alert)] for alert in pending],
+            progress=lambda done, total: progress("explain", {"done": done, "total": total}),
+            **explain_options
+        )
+
+    report["summary"]["explanations"] = {
+        **explanation_stats,
+        "pending": sum(1 for alert in pending if "explanation" not in alert)
     }
 
-    total_breaches = 0
-    total_near = 0
-    total_ideal = 0
+    metrics.count("alerts_explained", len(pending) - report["summary"]["explanations"]["pending"])
+    for key in ("calls", "retries", "failures", "cache_hits", "cache_misses"):
+        metrics.count(f"llm_{key}", explanation_stats.get(key, 0))
+    metrics.count("llm_latency_seconds_sum", explanation_stats.get("total_latency_ms", 0) / 1000)
+    metrics.count("llm_latency_seconds_max", explanation_stats.get("max_latency_ms", 0) / 1000)
+
+    if keep_metrics:
+        save_explanations(report["run_id"], report, pending)
+        return
+
+    with metrics.stage("history.explanations"):
+        report["summary"]["metrics"] = metrics.summary()
+        save_explanations(report["run_id"], report, pending)
+
+    report["summary"]["metrics"] = metrics.summary()
+
+
+def _explain_deferred(report, metrics, explain_options, progress):
+    try:
+        _explain_report(report, metrics, explain_options, progress)
+    except Exception as e:
+        # Results are already stored; explanations stay pending
+        print(f"Deferred explanations for run {report['run_id']} failed: {e}")
+    metrics.export()
+
+
+def wait_for_explanations(timeout: float = None) -> bool:
+    """
+    Waits for deferred explanation threads; True once none is running.
+    """
+    for thread in list(_deferred):
+        thread.join(timeout)
+        if not thread.is_alive():
+            _deferred.remove(thread)
+    return not _deferred
+
+
+def explain_run(run_id: int, **explain_options) -> dict:
+    """
+    Explains a stored run's pending alerts (e.g. after explain_mode="skip"
+    or a time budget ran out) and patches them into the store.
 
-    for inv in investments:
-        data = load_data_from_investment(inv)
+    Returns:
+    - The updated report, or None if the run doesn't exist
+    """
+    report = load_report(run_id)
+    if report is None:
+        return None
 
+    _explain_report(report, None, explain_options, lambda stage, info: None)
+    return report
+
+
+def _investment_entries(investments, rules, portfolio_results, portfolio_trends):
+    """
+    Report entries (alerts and per-investment counts) from the rule
+    results and trends of each investment.
+    """
+    entries = []
+
+    for inv, rule_results, trends in zip(
+        investments, portfolio_results, portfolio_trends
+    ):
         inv_breach_count = 0
         inv_near_count = 0
         inv_ideal_count = 0
         inv_alerts = []
 
-        for rule in rules:
-            # evaluate numeric logic
-            rule_result = evaluate_rule(rule, data)
+        for rule, rule_result in zip(rules, rule_results):
+            if rule_result is None:
+                continue
 
             # classify alert
-            alert = generate_alert(rule_result, data, rule["metric"])
+            alert = generate_alert(
+                rule_result, None, rule["metric"], trends[rule["metric"]]
+            )
 
             # Count severity type
             match alert["severity"]:
@@ -46,22 +242,11 @@ def check_breached_covenant(investments, rules):
                 case "ok":
                     inv_ideal_count += 1
 
-            # Generate explanation ONLY for non-ok alerts
-            if alert["severity"] != "ok":
-                time.sleep(1)  # lower risk of rate limiting
-                explanation = generate_explanation(alert)
-                alert["explanation"] = explanation
-
             # Add full rule result context into alert
             alert["rule_result"] = rule_result
             inv_alerts.append(alert)
 
-        # Update global counters
-        total_breaches += inv_breach_count
-        total_near += inv_near_count
-        total_ideal += inv_ideal_count
-
-        final_report["investments"].append({
+        entries.append({
             "id": inv["id"],
             "name": inv["name"],
             "type": inv["type"],
@@ -71,20 +256,174 @@ def check_breached_covenant(investments, rules):
             "alerts": inv_alerts
         })
 
+    return entries
+
+
+def _run_pipeline(investments, rules, workers, incremental, recheck, metrics, progress, stream=False):
+    final_report = {
+        "summary": {
+            "total_investments": 0,
+            "total_breaches": 0,
+            "total_near_breaches": 0,
+            "total_ideal": 0
+        },
+        "investments": []
+    }
+
+    # Validated and compiled once; invalid rules fail here, not mid-run
+    with metrics.stage("compile"):
+        compiled = compile_rules(rules)
+        rules = compiled.rules
+
+    # Fingerprints decide what an incremental run can skip
+    with metrics.stage("fingerprint"):
+        rules_fp = rules_fingerprint(rules)
+        inv_fps = [investment_fingerprint(inv) for inv in investments]
+
+        carried = {}
+        previous = None
+        if incremental:
+            recheck_ids = None if recheck is None else {str(i) for i in recheck}
+            previous = load_previous_report()
+            carried = find_unchanged(
+                investments, inv_fps, rules_fp, previous, recheck_ids
+            )
+
+    changed = [inv for i, inv in enumerate(investments) if i not in carried]
+
+    # Only (investment, rule) pairs whose applies_to matches and whose
+    # metric columns the source has are loaded and evaluated
+    with metrics.stage("applicability"):
+        applicable = applicability_matrix(changed, compiled)
+
+    # Streaming: each chunk is evaluated as soon as it is loaded, so the
+    # caller can show results before the whole portfolio is prepared
+    streamed = []
+    on_chunk = None
+
+    if stream:
+        progress("prepare", {"entries": [carried[i] for i in sorted(carried)]})
+
+        def on_chunk(start, chunk_latest, chunk_trends, chunk_available):
+            end = start + len(chunk_trends)
+            chunk_applicable = applicable[start:end] & chunk_available[:, compiled.column]
+            entries = _investment_entries(
+                changed[start:end], rules,
+                evaluate_rules_batch(compiled, chunk_latest, chunk_applicable),
+                chunk_trends
+            )
+            streamed.extend(entries)
+            progress("prepare", {"entries": entries})
+
+    # Load every investment once: latest metric values + trends
+    with metrics.stage("prepare"):
+        latest, portfolio_trends, available, load_stats = prepare_portfolio(
+            changed, compiled.metrics, workers,
+            expressions=compiled.expressions,
+            masks=metric_masks(applicable, compiled),
+            progress=lambda done, total: progress("prepare", {"done": done, "total": total}),
+            on_chunk=on_chunk
+        )
+    applicable &= available[:, compiled.column]
+
+    # applies_to skips are intended; missing columns are reported per pair
+    skipped = missing_columns(
+        changed, compiled, applicable, [i["columns"] for i in load_stats["investments"]]
+    )
+    for inv, inv_missing in zip(changed, skipped):
+        for entry in inv_missing:
+            print(
+                f"Skipped {entry['metric']} for investment {inv['id']}: "
+                f"columns {entry['columns']} not found in its data source"
+            )
+
+    # A blank or non-numeric latest cell (NaN once coerced) is no data,
+    # not a value to check; those covenants are reported per pair too
+    no_value = applicable & np.isnan(latest[:, compiled.column])
+    applicable &= ~no_value
+    unvalued = []
+    for inv, row in zip(changed, no_value):
+        inv_unvalued = [{"metric": rules[r]["metric"]} for r in np.flatnonzero(row)]
+        for entry in inv_unvalued:
+            print(f"Skipped {entry['metric']} for investment {inv['id']}: no latest value in its data source")
+        unvalued.append(inv_unvalued)
+
+    # Inside "prepare": busy time summed over worker processes
+    for stage in ("prefetch", "load", "latest", "trends"):
+        metrics.add_time(f"prepare.{stage}", load_stats.get(f"{stage}_ms", 0.0))
+    metrics.count("source_cache_hits", load_stats.get("cache_hits", 0))
+    metrics.count("source_cache_misses", load_stats.get("cache_misses", 0))
+    metrics.count("rows_read", sum(i["rows"] for i in load_stats["investments"]))
+    for inv, inv_stats in zip(changed, load_stats["investments"]):
+        metrics.investment(inv["id"], load_seconds=round(inv_stats["load_ms"] / 1000, 6), rows_read=inv_stats["rows"])
+
+    if stream:
+        # Already evaluated chunk by chunk (timed within "prepare")
+        new_entries = streamed
+        alerts_start = metrics.total_ms()
+    else:
+        # Evaluate every applicable rule for the whole portfolio in one pass
+        with metrics.stage("evaluate"):
+            portfolio_results = evaluate_rules_batch(compiled, latest, applicable)
+
+        alerts_start = metrics.total_ms()
+        new_entries = _investment_entries(changed, rules, portfolio_results, portfolio_trends)
+
+    # Merge fresh and carried-forward results in portfolio order
+    fresh = iter(new_entries)
+    final_report["investments"] = [
+        carried[i] if i in carried else next(fresh)
+        for i in range(len(investments))
+    ]
+    metrics.add_time("alerts", metrics.total_ms() - alerts_start)
+
     # Summary
+    entries = final_report["investments"]
     final_report["summary"]["total_investments"] = len(investments)
-    final_report["summary"]["total_breaches"] = total_breaches
-    final_report["summary"]["total_near_breaches"] = total_near
-    final_report["summary"]["total_ideal"] = total_ideal
+    final_report["summary"]["total_breaches"] = sum(e["breaches"] for e in entries)
+    final_report["summary"]["total_near_breaches"] = sum(e["near_breaches"] for e in entries)
+    final_report["summary"]["total_ideal"] = sum(e["ideal"] for e in entries)
+    final_report["summary"]["carried_forward"] = len(carried)
+    final_report["summary"]["skipped_rule_checks"] = int(applicable.size - applicable.sum())
+
+    # Covenants skipped for missing columns or a missing latest value, per
+    # (investment, metric); carried-forward investments keep the previous
+    # run's entries
+    for key, fresh_skips in (("missing_columns", skipped), ("missing_values", unvalued)):
+        previous_missing = previous["summary"].get(key, []) if carried else []
+        fresh_missing = iter(fresh_skips)
+        missing = []
+        for i, e in enumerate(entries):
+            if i in carried:
+                missing += [m for m in previous_missing if str(m["investment_id"]) == str(e["id"])]
+            else:
+                missing += [{"investment_id": e["id"], "name": e["name"], **m} for m in next(fresh_missing)]
+        final_report["summary"][key] = missing
+
+    # Explained in phase two (only non-ok alerts)
+    final_report["summary"]["explanations"] = {"pending": len(pending_explanations(final_report))}
+
+    final_report["fingerprints"] = {
+        "rules": rules_fp,
+        "investments": {
+            str(inv["id"]): fp for inv, fp in zip(investments, inv_fps)
+        }
+    }
+
+    metrics.count("investments", len(investments))
+    metrics.count("investments_checked", len(changed))
+    metrics.count("rule_checks", int(applicable.sum()))
 
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    history_path = f"history/{timestamp}.json"
+    final_report["summary"]["metrics"] = metrics.summary()
+    final_report["investment_metrics"] = metrics.investments
 
-    os.makedirs("history", exist_ok=True)
-    with open(history_path, "w") as f:
-        json.dump(final_report, f, indent=4)
+    # Phase one: results are stored before any LLM call
+    with metrics.stage("history"):
+        final_report["run_id"] = save_report(final_report)
 
-    final_report["history_file"] = history_path
+    # The stored summary was written before the history stage finished
+    final_report["summary"]["metrics"] = metrics.summary()
 
+    progress("results", {"report": final_report})
 
     return final_report
@@ -0,0 +1,18 @@
+import pytest
+
+from engine import data_loader
+
+
+@pytest.fixture
+def data_folder(tmp_path, monkeypatch):
+    """
+    An empty data folder the loaders read from, with the source caches
+    cleared and the binary cache disabled.
+    """
+    monkeypatch.setattr(data_loader, "default_folder", str(tmp_path) + "/")
+    monkeypatch.setattr(data_loader, "BINARY_CACHE_DIR", "")
+    data_loader.invalidate_source_cache()
+    data_loader._header_cache.clear()
+    yield tmp_path
+    data_loader.close_sqlite_connections()
+    data_loader.invalidate_source_cache()
@@ -0,0 +1,325 @@
+import io
+import os
+import json
+import sqlite3
+import threading
+
+import pandas as pd
+import pytest
+
+from engine import data_loader
+from engine.data_loader import load_data_from_investment
+
+
+def _warehouse(folder, name="warehouse.db", base=0.0):
+    conn = sqlite3.connect(folder / name)
+    conn.execute('CREATE TABLE metrics ("Period" TEXT, "Facility" TEXT, "Leverage" REAL)')
+    conn.executemany(
+        "INSERT INTO metrics VALUES (?, ?, ?)",
+        [
+            (f"2024-{month:02d}", facility, base + month + offset)
+            for month in range(1, 7)
+            for facility, offset in (("A", 0.0), ("B", 10.0))
+        ]
+    )
+    conn.commit()
+    conn.close()
+
+
+def _sqlite_rule(**options):
+    return {
+        "data_source": {
+            "type": "sqlite",
+            "path": "warehouse.db",
+            "table": "metrics",
+            **options
+        }
+    }
+
+
+def test_sqlite_tail_returns_latest_rows_in_order(data_folder):
+    _warehouse(data_folder)
+    rule = _sqlite_rule(order_by="Period", filter={"Facility": "A"})
+
+    df = load_data_from_investment(rule, columns=["Period", "Leverage"], tail=3)
+
+    assert list(df["Period"]) == ["2024-04", "2024-05", "2024-06"]
+    assert list(df["Leverage"]) == [4.0, 5.0, 6.0]
+
+
+def test_sqlite_since_is_a_watermark(data_folder):
+    _warehouse(data_folder)
+    rule = _sqlite_rule(order_by="Period", since="2024-04", filter={"Facility": "B"})
+
+    df = load_data_from_investment(rule)
+
+    assert list(df["Period"]) == ["2024-05", "2024-06"]
+
+
+@pytest.mark.parametrize("options", [
+    {"order_by": "Perod"},
+    {"order_by": "Perod", "since": "2024-04"}
+])
+def test_sqlite_unknown_order_by_raises(data_folder, options):
+    _warehouse(data_folder)
+
+    with pytest.raises(ValueError, match="Perod"):
+        load_data_from_investment(_sqlite_rule(**options), tail=3)
+
+
+def test_sqlite_reads_a_replaced_database_file(data_folder):
+    _warehouse(data_folder)
+    rule = _sqlite_rule(order_by="Period", filter={"Facility": "A"})
+
+    assert list(load_data_from_investment(rule, tail=1)["Leverage"]) == [6.0]
+
+    # Atomic swap: same path, new inode (the pooled connection is reopened)
+    _warehouse(data_folder, "replacement.db", base=100.0)
+    os.utime(data_folder / "replacement.db", ns=(0, 1))
+    os.replace(data_folder / "replacement.db", data_folder / "warehouse.db")
+
+    assert list(load_data_from_investment(rule, tail=1)["Leverage"]) == [106.0]
+
+
+def test_sqlite_unknown_filter_column_raises(data_folder):
+    _warehouse(data_folder)
+
+    with pytest.raises(ValueError, match="Facilty"):
+        load_data_from_investment(_sqlite_rule(filter={"Facilty": "A"}))
+
+
+def test_sqlite_skips_missing_columns(data_folder):
+    _warehouse(data_folder)
+
+    df = load_data_from_investment(
+        _sqlite_rule(order_by="Period"),
+        columns=["Leverage", "Coverage"],
+        tail=2,
+        dtypes={"Leverage": "float64", "Coverage": "float64"}
+    )
+
+    assert list(df.columns) == ["Leverage"]
+    assert len(df) == 2
+
+
+class _FakeResponse:
+    def __init__(self, payload, status_code=200, headers=None, next_url=None):
+        self.raw = io.BytesIO(json.dumps(payload).encode("utf-8"))
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.links = {"next": {"url": next_url}} if next_url else {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+
+class _FakeSession:
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append((url, dict(headers or {})))
+        return self.responses[url]()
+
+
+@pytest.fixture
+def api_session(data_folder, monkeypatch):
+    session = _FakeSession({})
+    monkeypatch.setattr(data_loader, "_api_session", lambda: session)
+    return session
+
+
+@pytest.mark.parametrize("options", [
+    {"url": "https://api.test/metrics", "max_pages": 0},
+    {"url": ""},
+    {}
+])
+def test_api_without_pages_returns_empty_frame(api_session, options):
+    rule = {"data_source": {"type": "api", **options}, "columns": ["Leverage"]}
+
+    df = load_data_from_investment(rule)
+
+    assert df.empty
+    assert api_session.requests == []
+
+
+def test_api_follows_pages_and_revalidates(api_session):
+    first = "https://api.test/metrics"
+    second = "https://api.test/metrics?page=2"
+    api_session.responses = {
+        first: lambda: _FakeResponse(
+            {"data": [{"Leverage": 1.0}], "next": second},
+            headers={"ETag": '"v1"'}
+        ),
+        second: lambda: _FakeResponse([{"Leverage": 2.0}])
+    }
+    rule = {"data_source": {"type": "api", "url": first}}
+
+    df = load_data_from_investment(rule)
+    assert list(df["Leverage"]) == [1.0, 2.0]
+
+    # Unchanged upstream: the cached frame is reused on 304
+    api_session.responses[first] = lambda: _FakeResponse(None, status_code=304)
+    again = load_data_from_investment(rule)
+
+    assert list(again["Leverage"]) == [1.0, 2.0]
+    assert api_session.requests[-1] == (first, {"If-None-Match": '"v1"'})
+
+
+def test_read_tail_lines_across_blocks(tmp_path):
+    path = tmp_path / "metrics.csv"
+    path.write_text("Period,Leverage\n" + "".join(f"2024-{i:03d},{i}.0\n\n" for i in range(200)))
+
+    tail = data_loader._read_tail_lines(path, 3, block_size=16)
+
+    assert tail == b"Period,Leverage\n2024-197,197.0\n2024-198,198.0\n2024-199,199.0\n"
+
+
+def test_read_tail_lines_shorter_than_tail(tmp_path):
+    path = tmp_path / "metrics.csv"
+    path.write_text("Period,Leverage\n2024-01,1.0")
+
+    assert data_loader._read_tail_lines(path, 5, block_size=4) == b"Period,Leverage\n2024-01,1.0\n"
+
+
+def test_csv_reads_only_wanted_columns_and_rows(data_folder):
+    (data_folder / "metrics.csv").write_text(
+        "Period,Leverage,Coverage\n" + "".join(f"2024-{i:02d},{i}.0,{i + 1}.0\n" for i in range(1, 13))
+    )
+    rule = {"data_source": {"type": "csv", "path": "metrics.csv"}}
+
+    df = load_data_from_investment(rule, columns=["Leverage", "Missing"], tail=2)
+
+    assert list(df.columns) == ["Leverage"]
+    assert list(df["Leverage"]) == [11.0, 12.0]
+
+    # A configured column subset narrows the read further
+    narrowed = load_data_from_investment({**rule, "columns": ["Coverage"]}, columns=["Leverage", "Coverage"])
+    assert list(narrowed.columns) == ["Coverage"]
+    assert len(narrowed) == 12
+
+
+def test_binary_cache_is_reused_until_the_source_changes(data_folder, tmp_path, monkeypatch):
+    cache_dir = tmp_path / "binary"
+    monkeypatch.setattr(data_loader, "BINARY_CACHE_DIR", str(cache_dir))
+    path = data_folder / "metrics.csv"
+    path.write_text("Period,Leverage\n2024-01,1.0\n2024-02,2.0\n")
+
+    reads = []
+
+    def reader(source):
+        reads.append(source)
+        return pd.read_csv(source)
+
+    first = data_loader._binary_cached(path, reader)
+    copies = list(cache_dir.glob("*.feather"))
+    assert len(reads) == 1 and len(copies) == 1
+
+    # Second load is served from the Feather copy
+    second = data_loader._binary_cached(path, reader)
+    assert len(reads) == 1
+    pd.testing.assert_frame_equal(second, first)
+
+    # Same contents, newer mtime: rebuilt, and the stale copy removed
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    data_loader._binary_cached(path, reader)
+    assert len(reads) == 2
+    assert list(cache_dir.glob("*.feather")) != copies
+    assert len(list(cache_dir.glob("*.feather"))) == 1
+
+    # Different size: rebuilt with the new rows
+    with open(path, "a") as f:
+        f.write("2024-03,3.0\n")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    third = data_loader._binary_cached(path, reader)
+    assert len(reads) == 3
+    assert list(third["Leverage"]) == [1.0, 2.0, 3.0]
+    assert len(list(cache_dir.glob("*.feather"))) == 1
+
+
+def test_full_csv_loads_write_the_binary_cache(data_folder, tmp_path, monkeypatch):
+    cache_dir = tmp_path / "binary"
+    monkeypatch.setattr(data_loader, "BINARY_CACHE_DIR", str(cache_dir))
+    (data_folder / "metrics.csv").write_text("Period,Leverage\n2024-01,1.0\n2024-02,2.0\n")
+    rule = {"data_source": {"type": "csv", "path": "metrics.csv"}}
+
+    df = load_data_from_investment(rule, columns=["Leverage"])
+
+    assert list(df["Leverage"]) == [1.0, 2.0]
+    assert len(list(cache_dir.glob("*.feather"))) == 1
+
+
+def _csv_rule(folder, name, values):
+    (folder / name).write_text("Leverage\n" + "\n".join(str(v) for v in values) + "\n")
+    return {"data_source": {"type": "csv", "path": name}}
+
+
+def test_source_cache_is_invalidated_by_the_file_fingerprint(data_folder):
+    rule = _csv_rule(data_folder, "a.csv", [1.0, 2.0])
+    before = data_loader.source_cache_stats()
+
+    load_data_from_investment(rule)
+    load_data_from_investment(rule)
+    stats = data_loader.source_cache_stats()
+    assert stats["misses"] - before["misses"] == 1
+    assert stats["hits"] - before["hits"] == 1
+    assert stats["entries"] == 1
+
+    _csv_rule(data_folder, "a.csv", [1.0, 2.0, 3.0])
+    df = load_data_from_investment(rule)
+
+    assert list(df["Leverage"]) == [1.0, 2.0, 3.0]
+    assert data_loader.source_cache_stats()["misses"] - before["misses"] == 2
+    assert data_loader.source_cache_stats()["entries"] == 1
+
+
+def test_source_cache_evicts_least_recently_used_beyond_the_cap(data_folder, monkeypatch):
+    rules = [_csv_rule(data_folder, f"{name}.csv", range(100)) for name in "abc"]
+    nbytes = int(load_data_from_investment(rules[0]).memory_usage(deep=True).sum())
+    data_loader.invalidate_source_cache()
+
+    # Room for two frames
+    monkeypatch.setattr(data_loader, "SOURCE_CACHE_MAX_MB", 2.5 * nbytes / (1024 * 1024))
+    for rule in rules:
+        load_data_from_investment(rule)
+
+    stats = data_loader.source_cache_stats()
+    assert stats["entries"] == 2 and stats["bytes"] == 2 * nbytes
+
+    misses = stats["misses"]
+    load_data_from_investment(rules[2])
+    load_data_from_investment(rules[0])
+    assert data_loader.source_cache_stats()["misses"] == misses + 1
+
+    # A frame bigger than the whole cap is never cached
+    monkeypatch.setattr(data_loader, "SOURCE_CACHE_MAX_MB", 0.5 * nbytes / (1024 * 1024))
+    data_loader.invalidate_source_cache()
+    load_data_from_investment(rules[1])
+    assert data_loader.source_cache_stats()["entries"] == 0
+
+
+def test_run_scope_reads_each_source_once(data_folder):
+    rule = _csv_rule(data_folder, "a.csv", [1.0, 2.0])
+
+    with data_loader.run_scope():
+        load_data_from_investment(rule)
+        _csv_rule(data_folder, "a.csv", [5.0])
+        within = load_data_from_investment(rule)
+
+        # Other threads don't see the scope
+        outside = []
+        thread = threading.Thread(target=lambda: outside.append(load_data_from_investment(rule)))
+        thread.start()
+        thread.join()
+
+    assert list(within["Leverage"]) == [1.0, 2.0]
+    assert list(outside[0]["Leverage"]) == [5.0]
+    assert list(load_data_from_investment(rule)["Leverage"]) == [5.0]
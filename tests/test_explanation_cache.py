@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+from engine import explanation_cache
+from engine.explanation_cache import ExplanationCache, cache_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ExplanationCache(str(tmp_path / "explanations.db"), ttl_hours=1, max_entries=2)
+
+
+def test_cache_key_depends_on_model_and_prompts():
+    key = cache_key("model-a", "system", "prompt")
+
+    assert key == cache_key("model-a", "system", "prompt")
+    assert key != cache_key("model-b", "system", "prompt")
+    assert key != cache_key("model-a", "system", "other prompt")
+
+
+def test_expired_entries_are_misses(cache, monkeypatch):
+    now = 1_000_000.0
+    monkeypatch.setattr(explanation_cache.time, "time", lambda: now)
+    cache.put("a", "explanation")
+
+    assert cache.get("a") == "explanation"
+
+    now += 3601
+    assert cache.get("a") is None
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+
+def test_least_recently_used_entry_is_evicted(cache, monkeypatch):
+    clock = iter(range(1_000_000, 1_000_100))
+    monkeypatch.setattr(explanation_cache.time, "time", lambda: float(next(clock)))
+
+    cache.put("a", "first")
+    cache.put("b", "second")
+    cache.get("a")
+    cache.put("c", "third")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "first"
+    assert cache.get("c") == "third"
+
+
+def test_default_cache_is_created_once(tmp_path, monkeypatch):
+    created = []
+
+    class SlowCache:
+        def __init__(self):
+            created.append(self)
+            threading.Event().wait(0.05)
+
+    monkeypatch.setattr(explanation_cache, "_default_cache", None)
+    monkeypatch.setattr(explanation_cache, "ExplanationCache", SlowCache)
+
+    caches = []
+    threads = [
+        threading.Thread(target=lambda: caches.append(explanation_cache.get_explanation_cache()))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert all(cache is created[0] for cache in caches)
@@ -0,0 +1,168 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from engine import explanation_cache, explanation_stage, llm_explainer
+from engine.explanation_cache import ExplanationCache
+from engine.explanation_stage import TokenBucket, explain_alerts
+from engine.llm_explainer import fallback_explanation
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """
+    OpenAI-compatible /chat/completions: answers with the queued error
+    statuses first, then with a completion naming the alert's metric.
+    """
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["messages"][-1]["content"]
+
+        with server.lock:
+            server.requests.append(prompt)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            error = server.errors.pop(0) if server.errors else None
+
+        try:
+            time.sleep(server.delay)
+            if error is not None:
+                status, headers = error
+                self._send(status, {"error": {"message": "Rate limited"}}, headers)
+            else:
+                metric = next(line for line in prompt.splitlines() if "Debt" in line or "Coverage" in line)
+                self._send(200, {
+                    "id": "stub",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": body["model"],
+                    "choices": [{
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": f"Stub: {metric.strip()}"}
+                    }]
+                })
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def llm_server(tmp_path, monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.errors = []
+    server.delay = 0.0
+    server.in_flight = 0
+    server.max_in_flight = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setattr(llm_explainer, "OPENROUTER_URL", f"http://127.0.0.1:{server.server_port}/v1")
+    monkeypatch.setattr(llm_explainer, "OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setattr(llm_explainer, "_client", None)
+    monkeypatch.setattr(explanation_stage, "EXPLAIN_BACKOFF_SECONDS", 0.01)
+    monkeypatch.setattr(
+        explanation_cache, "_default_cache", ExplanationCache(str(tmp_path / "explanations.db"))
+    )
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def _alert(metric="Debt-to-EBITDA", value=4.3, severity="warning"):
+    return {
+        "metric": metric,
+        "status": "Near Breach",
+        "severity": severity,
+        "current_value": value,
+        "limit": 4.5,
+        "trend": "deteriorating",
+        "rate_of_change": 5.0,
+        "trend_confidence": "high"
+    }
+
+
+def test_rate_limited_call_is_retried_after_retry_after(llm_server):
+    llm_server.errors = [(429, {"Retry-After": "0.2"}), (429, {})]
+    alert = _alert()
+
+    start = time.perf_counter()
+    stats = explain_alerts([alert], rate_per_sec=0, max_retries=3, use_cache=False)
+
+    assert time.perf_counter() - start >= 0.2
+    assert len(llm_server.requests) == 3
+    assert stats["calls"] == 1 and stats["retries"] == 2 and stats["failures"] == 0
+    assert alert["explanation"].startswith("Stub: ")
+    assert alert["explanation_attempts"] == 3
+
+
+def test_exhausted_retries_fall_back_and_are_not_cached(llm_server):
+    llm_server.errors = [(429, {"Retry-After": "0"})] * 3
+    alert = _alert()
+
+    stats = explain_alerts([alert], rate_per_sec=0, max_retries=2)
+
+    assert len(llm_server.requests) == 3
+    assert stats["failures"] == 1 and stats["retries"] == 2
+    assert alert["explanation"] == fallback_explanation(alert)
+
+    # The next run asks the model again instead of reusing the fallback
+    retried = _alert()
+    stats = explain_alerts([retried], rate_per_sec=0, max_retries=2)
+    assert stats["cache_hits"] == 0
+    assert retried["explanation"].startswith("Stub: ")
+
+
+def test_in_flight_requests_are_capped(llm_server):
+    llm_server.delay = 0.1
+    alerts = [_alert(value=4.21 + i / 100) for i in range(8)]
+
+    stats = explain_alerts(alerts, concurrency=3, rate_per_sec=0, use_cache=False)
+
+    assert stats["calls"] == 8
+    assert llm_server.max_in_flight == 3
+
+
+def test_second_run_is_served_from_the_cache(llm_server):
+    first = [_alert(), _alert("Interest-Coverage", 1.8, "critical")]
+    explain_alerts(first, rate_per_sec=0)
+
+    second = [_alert(), _alert("Interest-Coverage", 1.8, "critical")]
+    stats = explain_alerts(second, rate_per_sec=0)
+
+    assert len(llm_server.requests) == 2
+    assert stats["cache_hits"] == 2 and stats["calls"] == 0
+    assert [alert["explanation"] for alert in second] == [alert["explanation"] for alert in first]
+    assert all(alert["explanation_cached"] for alert in second)
+
+
+def test_token_bucket_limits_the_rate():
+    bucket = TokenBucket(rate=20, burst=2)
+
+    start = time.perf_counter()
+    for _ in range(4):
+        bucket.acquire()
+
+    # Two calls from the burst, then one every 1/20 s
+    assert time.perf_counter() - start >= 0.09
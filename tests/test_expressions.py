@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine.expressions import (
+    ExpressionError,
+    ExpressionPlan,
+    compile_rule_expressions,
+    parse_expression,
+)
+
+
+def test_hyphenated_names_and_subtraction():
+    assert parse_expression("EBITDA-MM - Capex-MM") == (
+        "sub", ("col", "EBITDA-MM"), ("col", "Capex-MM")
+    )
+
+
+def test_precedence_brackets_and_numbers():
+    assert parse_expression("-[Cash Balance] + 2 * (a / 1.5e1)") == (
+        "add",
+        ("neg", ("col", "Cash Balance")),
+        ("mul", ("num", 2.0), ("div", ("col", "a"), ("num", 15.0)))
+    )
+
+
+def test_functions():
+    assert parse_expression("max(Rolling_Sum(a, 4), abs(b))") == (
+        "max", ("rolling_sum", ("col", "a"), 4), ("abs", ("col", "b"))
+    )
+
+
+@pytest.mark.parametrize("text", [
+    "a +",
+    "(a - b",
+    "a b",
+    "a $ b",
+    "lag(a, 0)",
+    "rolling_mean(a, 2.5)",
+    "rolling_sum(a, b)",
+    "min(a)",
+    "abs(a, b)",
+    "median(a)"
+])
+def test_invalid_expressions(text):
+    with pytest.raises(ExpressionError):
+        parse_expression(text)
+
+
+def test_plan_shares_subexpressions_and_tracks_columns():
+    plan = ExpressionPlan({
+        "Net-Leverage": "(Debt - Cash) / EBITDA",
+        "Net-Debt": "Debt - Cash"
+    })
+
+    # Debt, Cash, Debt - Cash, EBITDA, division
+    assert len(plan.steps) == 5
+    assert plan.columns == ["Debt", "Cash", "EBITDA"]
+    assert plan.metric_columns("Net-Debt") == frozenset({"Debt", "Cash"})
+    assert plan.metric_columns("Leverage") == frozenset({"Leverage"})
+    assert plan.source_columns(["Leverage", "Net-Debt"]) == ["Leverage", "Debt", "Cash"]
+
+
+def test_plan_lookback():
+    plan = ExpressionPlan({
+        "a": "lag(x, 2)",
+        "b": "rolling_mean(lag(y, 1), 4)"
+    })
+
+    assert plan.lookback == 4
+
+
+def test_plan_evaluate():
+    df = pd.DataFrame({"x": [1.0, 2.0, 3.0, 4.0], "y": [2.0, 0.0, 1.0, 4.0]})
+    plan = ExpressionPlan({
+        "ratio": "x / y",
+        "growth": "x - lag(x, 1)",
+        "rolling": "rolling_sum(x, 3)",
+        "capped": "min(x, 2) + max(-y, -1)",
+        "missing": "x * z"
+    })
+
+    values = plan.evaluate(df)
+
+    np.testing.assert_array_equal(values["ratio"], [0.5, np.inf, 3.0, 1.0])
+    np.testing.assert_array_equal(values["growth"], [np.nan, 1.0, 1.0, 1.0])
+    np.testing.assert_array_equal(values["rolling"], [np.nan, np.nan, 6.0, 9.0])
+    np.testing.assert_array_equal(values["capped"], [0.0, 2.0, 1.0, 1.0])
+    assert np.isnan(values["missing"]).all()
+
+    applied = plan.apply(df)
+    assert list(applied.columns) == ["x", "y", "ratio", "growth", "rolling", "capped", "missing"]
+    assert list(df.columns) == ["x", "y"]
+
+
+def test_conflicting_rule_expressions():
+    rules = [
+        {"metric": "Net-Debt", "expression": "Debt - Cash"},
+        {"metric": "Net-Debt", "expression": "Debt"}
+    ]
+
+    with pytest.raises(ExpressionError, match="conflicting"):
+        compile_rule_expressions(rules)
+
+    assert compile_rule_expressions(rules[:1] * 2).defines("Net-Debt")
@@ -0,0 +1,104 @@
+import json
+import sqlite3
+import threading
+from contextlib import closing
+
+import pytest
+
+from engine import history_store
+
+
+def _report(value, severity="warning"):
+    return {
+        "summary": {"total_investments": 1, "total_breaches": 0, "total_near_breaches": 1, "total_ideal": 0},
+        "investments": [{
+            "id": 1,
+            "name": "TechCorp Industries",
+            "type": "Senior Secured Loan",
+            "breaches": 0,
+            "near_breaches": 1,
+            "ideal": 0,
+            "alerts": [{
+                "metric": "Debt-to-EBITDA",
+                "status": "Near Breach",
+                "severity": severity,
+                "current_value": value,
+                "limit": 3.5,
+                "trend": "deteriorating",
+                "rate_of_change": 4.0,
+                "trend_confidence": "high"
+            }]
+        }]
+    }
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    legacy = tmp_path / "legacy"
+    legacy.mkdir()
+    for i, name in enumerate(["2026-01-04_08-03-06.json", "2026-01-04_08-05-57.json"]):
+        (legacy / name).write_text(json.dumps(_report(3.0 + i)))
+
+    monkeypatch.setattr(history_store, "HISTORY_DIR", str(legacy))
+    return str(tmp_path / "history.db")
+
+
+def test_save_and_load_report(store):
+    run_id = history_store.save_report(_report(3.4), path=store)
+
+    report = history_store.load_report(run_id, path=store)
+
+    assert report["run_id"] == run_id
+    assert report["investments"][0]["alerts"][0]["current_value"] == 3.4
+    assert history_store.count_runs(path=store) == 3
+
+
+def test_concurrent_first_connections_import_legacy_reports_once(store):
+    errors = []
+
+    def connect():
+        try:
+            history_store.count_runs(path=store)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=connect) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert history_store.count_runs(path=store) == 2
+
+
+def test_legacy_import_from_another_process_is_skipped(store):
+    history_store.count_runs(path=store)
+
+    # A second process initializing the same new store re-runs the import
+    with closing(sqlite3.connect(store)) as conn:
+        assert history_store.import_legacy_reports(conn) == 0
+
+    assert history_store.count_runs(path=store) == 2
+
+
+def test_query_series(store):
+    # The two legacy runs (3.0, 4.0) are imported first
+    history_store.save_report(_report(3.2), path=store)
+    history_store.save_report(_report(3.6, severity="critical"), path=store)
+
+    series = history_store.query_series(1, "Debt-to-EBITDA", path=store)
+
+    assert [point["current_value"] for point in series] == [3.0, 4.0, 3.2, 3.6]
+    assert [point["severity_score"] for point in series] == [1, 1, 1, 2]
+    assert series[0]["created_at"] == "2026-01-04 08:03:06"
+    assert series[-1]["limit"] == 3.5
+
+    latest = history_store.query_series(1, "Debt-to-EBITDA", last_n=2, path=store)
+    assert [point["current_value"] for point in latest] == [3.2, 3.6]
+
+    since = history_store.query_series(1, "Debt-to-EBITDA", since="2026-01-04 08:05:00", path=store)
+    assert len(since) == 3
+
+    assert history_store.query_series(2, "Debt-to-EBITDA", path=store) == []
+    assert history_store.list_metrics(1, path=store) == ["Debt-to-EBITDA"]
@@ -0,0 +1,66 @@
+import os
+
+from engine.incremental import find_unchanged, investment_fingerprint, rules_fingerprint
+
+
+def _investment(inv_id, data_source):
+    return {"id": inv_id, "name": f"Investment {inv_id}", "data_source": data_source}
+
+
+def _previous(investments, fingerprints, rules_fp):
+    return {
+        "fingerprints": {
+            "rules": rules_fp,
+            "investments": {str(inv["id"]): fp for inv, fp in zip(investments, fingerprints)}
+        },
+        "investments": [{"id": inv["id"], "alerts": []} for inv in investments]
+    }
+
+
+def test_fingerprint_changes_with_the_source_file(data_folder):
+    path = data_folder / "metrics.csv"
+    path.write_text("Leverage\n1.0\n")
+    inv = _investment(1, {"type": "csv", "path": "metrics.csv"})
+
+    before = investment_fingerprint(inv)
+    assert before == investment_fingerprint(inv)
+
+    path.write_text("Leverage\n1.0\n2.0\n")
+    os.utime(path, ns=(0, 1))
+    assert investment_fingerprint(inv) != before
+
+    assert investment_fingerprint({**inv, "name": "Renamed"}) != investment_fingerprint(inv)
+
+
+def test_fingerprint_unknown_for_api_and_missing_files(data_folder):
+    assert investment_fingerprint(_investment(1, {"type": "api", "url": "https://api.test"})) is None
+    assert investment_fingerprint(_investment(2, {"type": "csv", "path": "missing.csv"})) is None
+
+
+def test_find_unchanged():
+    investments = [_investment(i, {}) for i in (1, 2, 3)]
+    rules_fp = rules_fingerprint([{"metric": "Leverage"}])
+    previous = _previous(investments, ["a", "b", "c"], rules_fp)
+
+    unchanged = find_unchanged(investments, ["a", "x", None], rules_fp, previous)
+
+    assert list(unchanged) == [0]
+    assert unchanged[0]["id"] == 1
+
+
+def test_find_unchanged_rechecks_everything_when_rules_change():
+    investments = [_investment(1, {})]
+    previous = _previous(investments, ["a"], rules_fingerprint([{"metric": "Leverage"}]))
+
+    assert find_unchanged(investments, ["a"], rules_fingerprint([{"metric": "Coverage"}]), previous) == {}
+    assert find_unchanged(investments, ["a"], "rules", None) == {}
+
+
+def test_find_unchanged_with_recheck_set():
+    investments = [_investment(i, {}) for i in (1, 2, 3)]
+    previous = _previous(investments, ["a", "b", "c"], "rules")
+
+    # Unfingerprintable sources are trusted unless the watcher named them
+    unchanged = find_unchanged(investments, ["a", "b", None], "rules", previous, recheck={"2"})
+
+    assert sorted(unchanged) == [0, 2]
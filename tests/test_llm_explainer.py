@@ -0,0 +1,67 @@
+import pytest
+
+from engine.explanation_stage import TokenBucket, _explain_batch
+from engine.llm_explainer import BatchResponseError, parse_batch_response
+
+
+def test_parse_batch_response_in_alert_order():
+    text = """```json
+    {"explanations": [
+        {"id": 2, "explanation": " Coverage is falling. "},
+        {"id": "1", "explanation": "Leverage is near its limit."}
+    ]}
+    ```"""
+
+    assert parse_batch_response(text, 2) == ["Leverage is near its limit.", "Coverage is falling."]
+
+
+def test_parse_batch_response_ignores_unknown_and_empty_ids():
+    text = '{"explanations": [{"id": 1, "explanation": "ok"}, {"id": 3, "explanation": "x"}, {"id": 2, "explanation": " "}]}'
+
+    assert parse_batch_response(text, 2) == ["ok", None]
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "Sorry, I can't help with that.",
+    "} {",
+    '{"explanations": [{"id": 1, "explanation": "cut off',
+    '{"explanations": [{"id": 1, "explanation": "a"},]}',
+    '{"results": []}',
+    '{"explanations": null}',
+    '{"explanations": {"id": 1, "explanation": "a"}}',
+    '{"explanations": [{"id": "first", "explanation": "a"}]}',
+    '{"explanations": [{"id": 1}]}',
+    '{"explanations": []}',
+])
+def test_parse_batch_response_malformed(text):
+    with pytest.raises(BatchResponseError):
+        parse_batch_response(text, 2)
+
+
+def test_unparseable_batch_falls_back_to_single_calls():
+    alerts = [{"metric": "Leverage"}, {"metric": "Coverage"}, {"metric": "Liquidity"}]
+
+    def batch_fn(batch):
+        raise BatchResponseError("Malformed batched response")
+
+    calls = _explain_batch(
+        alerts, TokenBucket(0, 1), 0, lambda alert: f"{alert['metric']} alone", batch_fn
+    )
+
+    assert [alert["explanation"] for alert in alerts] == ["Leverage alone", "Coverage alone", "Liquidity alone"]
+    assert len(calls) == 4 and calls[0]["batch"] and not calls[0]["ok"]
+
+
+def test_partial_batch_explains_the_rest_one_by_one():
+    alerts = [{"metric": "Leverage"}, {"metric": "Coverage"}]
+
+    calls = _explain_batch(
+        alerts, TokenBucket(0, 1), 0,
+        lambda alert: f"{alert['metric']} alone",
+        lambda batch: ["Leverage in batch", None]
+    )
+
+    assert [alert["explanation"] for alert in alerts] == ["Leverage in batch", "Coverage alone"]
+    assert alerts[0]["explanation_batch"] == 2
+    assert len(calls) == 2
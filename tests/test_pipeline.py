@@ -0,0 +1,175 @@
+import time
+
+import pytest
+
+from engine import history_store
+from engine.background import PipelineRunner
+from engine.history_store import load_report
+from main import check_breached_covenant, explain_run, pending_explanations, wait_for_explanations
+
+RULES = [
+    {
+        "name": "Debt-to-EBITDA Ratio",
+        "metric": "Debt-to-EBITDA",
+        "ideal_value": 2.5,
+        "near_breach_value": 4.2,
+        "threshold_value": 4.5,
+        "covenant_type": "maximum"
+    },
+    {
+        "name": "Interest Coverage Ratio",
+        "metric": "Interest-Coverage",
+        "ideal_value": 3.0,
+        "near_breach_value": 2.0,
+        "threshold_value": 1.5,
+        "covenant_type": "minimum"
+    }
+]
+
+
+@pytest.fixture
+def portfolio(data_folder, tmp_path, monkeypatch):
+    monkeypatch.setattr(history_store, "HISTORY_DB", str(tmp_path / "history.db"))
+    monkeypatch.setattr(history_store, "HISTORY_DIR", str(tmp_path / "legacy"))
+
+    investments = []
+    for i in range(9):
+        name = f"investment{i}.csv"
+        rows = [f"{1.0 + i * 0.5 + step * 0.1},{4.0 - i * 0.4}" for step in range(8)]
+        (data_folder / name).write_text("Debt-to-EBITDA,Interest-Coverage\n" + "\n".join(rows) + "\n")
+        investments.append({
+            "id": i,
+            "name": f"Investment {i}",
+            "type": "Senior Secured Loan",
+            "data_source": {"type": "csv", "path": name}
+        })
+
+    return investments
+
+
+def _run(investments, **options):
+    report = check_breached_covenant(investments, RULES, explain_mode="skip", **options)
+    report.pop("run_id")
+    report["summary"].pop("metrics")
+    report.pop("investment_metrics")
+    return report
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_streamed_entries_match_the_report(portfolio, workers):
+    updates = []
+    report = _run(portfolio, workers=workers, progress=lambda stage, info: updates.append((stage, info)))
+
+    streamed = [entry for stage, info in updates if "entries" in info for entry in info["entries"]]
+    chunks = [i for i, (stage, info) in enumerate(updates) if info.get("entries")]
+    results = [i for i, (stage, info) in enumerate(updates) if stage == "results"]
+
+    assert streamed == report["investments"]
+    # Several chunks, all before the full report
+    assert len(chunks) > 1
+    assert chunks[-1] < results[0]
+
+    assert _run(portfolio, workers=workers) == report
+
+
+def test_carried_forward_entries_are_streamed_first(portfolio, data_folder):
+    first = _run(portfolio, incremental=True)
+    (data_folder / "investment4.csv").write_text("Debt-to-EBITDA,Interest-Coverage\n5.0,1.0\n")
+
+    updates = []
+    report = _run(portfolio, incremental=True, progress=lambda stage, info: updates.append(info))
+    streamed = [info["entries"] for info in updates if "entries" in info]
+
+    assert report["summary"]["carried_forward"] == 8
+    assert streamed[0] == first["investments"][:4] + first["investments"][5:]
+    assert [entry["id"] for chunk in streamed[1:] for entry in chunk] == [4]
+    assert report["investments"][4]["breaches"] == 2
+
+
+def test_background_run_collects_streamed_entries(portfolio):
+    run, started = PipelineRunner().submit(portfolio, RULES, explain_mode="skip")
+
+    assert started
+    assert run.wait(30)
+    assert run.status == "done"
+    assert run.entries == run.report["investments"]
+
+
+def test_non_numeric_latest_value_is_not_a_breach(portfolio, data_folder):
+    (data_folder / "investment0.csv").write_text("Debt-to-EBITDA,Interest-Coverage\n1.0,4.0\n--,4.0\n")
+    (data_folder / "investment1.csv").write_text("Debt-to-EBITDA,Interest-Coverage\n")
+
+    report = _run(portfolio[:3])
+    first, empty, clean = report["investments"]
+
+    assert [alert["metric"] for alert in first["alerts"]] == ["Interest-Coverage"]
+    assert first["breaches"] == 0
+    assert empty["alerts"] == []
+    assert len(clean["alerts"]) == 2
+    assert report["summary"]["missing_values"] == [
+        {"investment_id": 0, "name": "Investment 0", "metric": "Debt-to-EBITDA"},
+        {"investment_id": 1, "name": "Investment 1", "metric": "Debt-to-EBITDA"},
+        {"investment_id": 1, "name": "Investment 1", "metric": "Interest-Coverage"}
+    ]
+    assert report["summary"]["missing_columns"] == []
+
+
+def _stub_explain(alert):
+    return f"Stub: {alert['metric']} {alert['current_value']}"
+
+
+def test_deferred_explanations_are_written_back(portfolio):
+    report = check_breached_covenant(
+        portfolio, RULES, explain_mode="deferred", explain_options={"explain_fn": _stub_explain}
+    )
+
+    assert wait_for_explanations(30)
+    stored = load_report(report["run_id"])
+    alerts = [alert for inv in stored["investments"] for alert in inv["alerts"] if alert["severity"] != "ok"]
+
+    assert alerts
+    assert all(alert["explanation"] == _stub_explain(alert) for alert in alerts)
+    assert stored["summary"]["explanations"]["pending"] == 0
+
+
+def test_skipped_explanations_stay_pending_until_explain_run(portfolio):
+    report = check_breached_covenant(portfolio, RULES, explain_mode="skip")
+
+    stored = load_report(report["run_id"])
+    pending = pending_explanations(stored)
+    assert pending
+    assert stored["summary"]["explanations"] == {"pending": len(pending)}
+
+    explain_run(report["run_id"], explain_fn=_stub_explain)
+
+    stored = load_report(report["run_id"])
+    assert pending_explanations(stored) == []
+    assert stored["summary"]["explanations"]["pending"] == 0
+    assert stored["summary"]["explanations"]["calls"] == len(pending)
+    assert explain_run(report["run_id"] + 100, explain_fn=_stub_explain) is None
+
+
+def test_time_budget_leaves_the_rest_pending(portfolio):
+    def slow_explain(alert):
+        time.sleep(0.1)
+        return _stub_explain(alert)
+
+    report = check_breached_covenant(
+        portfolio, RULES, explain_mode="now",
+        explain_options={"explain_fn": slow_explain, "time_budget": 0.05, "concurrency": 1, "rate_per_sec": 0}
+    )
+
+    # Alerts not started within the budget keep no explanation (no
+    # fallback text) and are left for a later pass
+    stats = report["summary"]["explanations"]
+    stored = load_report(report["run_id"])
+    pending = pending_explanations(stored)
+
+    assert stats["calls"] >= 1 and stats["deferred"] > 0
+    assert stats["pending"] == stats["deferred"] == len(pending)
+    # Critical alerts are explained first
+    explained = [alert for inv in stored["investments"] for alert in inv["alerts"] if "explanation" in alert]
+    assert all(alert["severity"] == "critical" for alert in explained)
+
+    explain_run(report["run_id"], explain_fn=_stub_explain)
+    assert pending_explanations(load_report(report["run_id"])) == []
@@ -0,0 +1,25 @@
+import numpy as np
+
+from engine.portfolio import prepare_portfolio
+
+
+def _csv_investment(folder, name, rows):
+    (folder / name).write_text("Period,Leverage,Coverage\n" + "\n".join(rows) + "\n")
+    return {"name": name, "data_source": {"type": "csv", "path": name}}
+
+
+def test_non_numeric_cell_only_affects_its_investment(data_folder):
+    investments = [
+        _csv_investment(data_folder, "clean.csv", ["2024-01,2.0,3.0", "2024-02,2.5,3.5", "2024-03,3.0,4.0"]),
+        _csv_investment(data_folder, "dirty.csv", ["2024-01,1.0,2.0", "2024-02,1.5,n.a.", "2024-03,--,2.5"])
+    ]
+
+    latest, trends, available, stats = prepare_portfolio(
+        investments, ["Leverage", "Coverage"], workers=1, window=3
+    )
+
+    assert latest[0].tolist() == [3.0, 4.0]
+    assert np.isnan(latest[1, 0])
+    assert latest[1, 1] == 2.5
+    assert available.all()
+    assert trends[0]["Leverage"]["trend"] == "improving"
@@ -0,0 +1,187 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+
+from engine.portfolio import applicability_matrix
+from engine.rule_engine import (
+    RuleConfigError,
+    compile_rules,
+    evaluate_rule,
+    evaluate_rules_batch,
+    latest_values_matrix,
+    load_rule_set,
+    load_rules,
+)
+
+RULES = [
+    {
+        "name": "Debt-to-EBITDA Ratio",
+        "metric": "Debt-to-EBITDA",
+        "ideal_value": 2.5,
+        "near_breach_value": 4.2,
+        "threshold_value": 4.5,
+        "covenant_type": "maximum",
+        "severity": "high"
+    },
+    {
+        "name": "Interest Coverage Ratio",
+        "metric": "Interest-Coverage",
+        "ideal_value": 3.0,
+        "near_breach_value": 2.0,
+        "threshold_value": 1.5,
+        "covenant_type": "Minimum"
+    }
+]
+
+# Below ideal, ideal boundary, near-breach band, near boundary, threshold
+# boundary and breached, for both covenant directions
+VALUES = [
+    (1.0, 4.0),
+    (2.5, 3.0),
+    (4.3, 1.8),
+    (4.2, 2.0),
+    (4.5, 1.5),
+    (6.0, 0.5)
+]
+
+
+def _frame(debt, coverage):
+    return pd.DataFrame({
+        "Debt-to-EBITDA": [0.0, debt],
+        "Interest-Coverage": [9.0, coverage]
+    })
+
+
+@pytest.mark.parametrize("debt, coverage", VALUES)
+def test_rule_set_matches_evaluate_rule(debt, coverage):
+    df = _frame(debt, coverage)
+
+    expected = [evaluate_rule(rule, df) for rule in RULES]
+
+    assert compile_rules(RULES).evaluate(df) == expected
+
+
+def test_batch_matches_evaluate_rule_for_every_investment():
+    frames = [_frame(debt, coverage) for debt, coverage in VALUES]
+    compiled = compile_rules(RULES)
+
+    results = evaluate_rules_batch(compiled, latest_values_matrix(frames, compiled.metrics))
+
+    assert results == [[evaluate_rule(rule, df) for rule in RULES] for df in frames]
+
+
+def test_batch_skips_pairs_outside_the_mask():
+    compiled = compile_rules(RULES)
+    latest = latest_values_matrix([_frame(1.0, 4.0)], compiled.metrics)
+
+    results = evaluate_rules_batch(compiled, latest, np.array([[True, False]]))
+
+    assert results[0][0]["ideal_state"] is True
+    assert results[0][1] is None
+
+
+def test_latest_values_matrix_missing_columns():
+    frames = [_frame(1.0, 4.0), pd.DataFrame({"Debt-to-EBITDA": [3.0]}), pd.DataFrame()]
+
+    latest = latest_values_matrix(frames, ["Debt-to-EBITDA", "Interest-Coverage"], allow_missing=True)
+
+    assert latest[0].tolist() == [1.0, 4.0]
+    assert latest[1, 0] == 3.0
+    assert np.isnan(latest[1, 1]) and np.isnan(latest[2]).all()
+
+    with pytest.raises(ValueError, match="Interest-Coverage"):
+        latest_values_matrix(frames[1:2], ["Interest-Coverage"])
+
+
+def test_rule_set_reports_every_invalid_rule():
+    rules = [
+        {**RULES[0], "covenant_type": "between"},
+        {**RULES[0], "near_breach_value": 5.0},
+        {**RULES[1], "threshold_value": "low"},
+        {"name": "Incomplete", "metric": "Leverage"},
+        {**RULES[0], "expression": "Debt /"},
+        {**RULES[0], "applies_to": {"sectors": ["Retail"]}},
+        {**RULES[0], "applies_to": {"types": None}},
+        "not a rule"
+    ]
+
+    with pytest.raises(RuleConfigError) as excinfo:
+        compile_rules(rules)
+
+    message = str(excinfo.value)
+    for expected in (
+        "unsupported covenant_type 'between'",
+        "ideal_value <= near_breach_value <= threshold_value",
+        "values must be numbers",
+        "'Incomplete' is missing ideal_value",
+        "Expected 'more input'",
+        "unknown applies_to key(s) ['sectors']",
+        "applies_to types must be a name or a list of names",
+        "Rule #8 is not a mapping"
+    ):
+        assert expected in message
+
+
+def test_shipped_rules_compile():
+    compiled = load_rule_set()
+
+    assert len(compiled) == len(load_rules())
+    assert compile_rules(compiled) is compiled
+
+
+def test_load_rule_set_recompiles_when_the_file_changes(tmp_path):
+    path = tmp_path / "rules.yaml"
+    path.write_text(yaml.safe_dump({"rules": RULES[:1]}))
+    first = load_rule_set(str(path))
+
+    assert load_rule_set(str(path)) is first
+
+    path.write_text(yaml.safe_dump({"rules": RULES}))
+    os.utime(path, ns=(0, 1))
+
+    assert len(load_rule_set(str(path))) == 2
+
+
+def test_applicability_masks(data_folder):
+    rules = [
+        {**RULES[0], "applies_to": {"types": "Senior Secured Loan"}},
+        {**RULES[1], "applies_to": {"industries": ["Retail", "technology"]}}
+    ]
+    compiled = compile_rules(rules)
+    (data_folder / "debt.csv").write_text("Debt-to-EBITDA\n1.0\n")
+    investments = [
+        {
+            "type": "Senior Secured Loan",
+            "investment_details": {"industry": "Technology"},
+            "data_source": {"type": "csv", "path": "debt.csv"}
+        },
+        {
+            "type": "Mezzanine Debt",
+            "investment_details": {"industry": "Retail"},
+            "data_source": {"type": "api", "url": "https://api.test"}
+        }
+    ]
+
+    assert compiled.attribute_mask(investments[0]).tolist() == [True, True]
+    assert compiled.attribute_mask(investments[1]).tolist() == [False, True]
+    assert compiled.column_mask(["Interest-Coverage"]).tolist() == [False, True]
+
+    # Header probes narrow file sources; APIs are narrowed after load
+    assert applicability_matrix(investments, compiled).tolist() == [[True, False], [False, True]]
+
+
+def test_batch_skips_metrics_without_a_latest_value():
+    compiled = compile_rules(RULES)
+    frames = [
+        pd.DataFrame({"Debt-to-EBITDA": [], "Interest-Coverage": []}),
+        pd.DataFrame({"Debt-to-EBITDA": [1.0, np.nan], "Interest-Coverage": [2.0, 4.0]})
+    ]
+
+    results = evaluate_rules_batch(compiled, latest_values_matrix(frames, compiled.metrics, allow_missing=True))
+
+    assert results[0] == [None, None]
+    assert results[1][0] is None
+    assert results[1][1]["ideal_state"] is True
@@ -0,0 +1,89 @@
+from datetime import datetime
+
+import pytest
+
+from engine.schedular import CronSchedule, MonitoringJob, MonitoringScheduler, load_schedule
+
+
+@pytest.mark.parametrize("expression, moment, expected", [
+    # 2024-01-05 is a Friday
+    ("*/30 9-17 * * 1-5", datetime(2024, 1, 5, 17, 10), datetime(2024, 1, 5, 17, 30)),
+    ("*/30 9-17 * * 1-5", datetime(2024, 1, 5, 17, 30), datetime(2024, 1, 8, 9, 0)),
+    ("0 9 * * *", datetime(2024, 1, 5, 9, 0, 30), datetime(2024, 1, 6, 9, 0)),
+    ("15,45 * * * *", datetime(2024, 1, 5, 8, 50), datetime(2024, 1, 5, 9, 15)),
+    ("5/20 * * * *", datetime(2024, 1, 5, 8, 26), datetime(2024, 1, 5, 8, 45)),
+    ("0 0 31 * *", datetime(2024, 1, 31), datetime(2024, 3, 31)),
+    ("0 0 29 2 *", datetime(2024, 3, 1), datetime(2028, 2, 29)),
+    ("59 23 31 12 *", datetime(2024, 12, 31, 23, 59), datetime(2025, 12, 31, 23, 59)),
+    ("0 0 * * 7", datetime(2024, 1, 5), datetime(2024, 1, 7)),
+    # Day-of-month and day-of-week both restricted: either one matches
+    ("0 12 1 * 0", datetime(2024, 1, 5), datetime(2024, 1, 7, 12, 0)),
+    ("0 12 6 * 0", datetime(2024, 1, 5), datetime(2024, 1, 6, 12, 0)),
+])
+def test_next_after(expression, moment, expected):
+    assert CronSchedule(expression).next_after(moment) == expected
+
+
+@pytest.mark.parametrize("expression", [
+    "* * * *",
+    "60 * * * *",
+    "* 24 * * *",
+    "*/0 * * * *",
+    "5-1 * * * *",
+    "a * * * *",
+    "* * 0 * *",
+])
+def test_invalid_cron_expressions(expression):
+    with pytest.raises(ValueError, match="(?i)cron"):
+        CronSchedule(expression)
+
+
+def test_cron_that_never_fires():
+    with pytest.raises(ValueError, match="never fires"):
+        CronSchedule("0 0 30 2 *").next_after(datetime(2024, 1, 1))
+
+
+def test_job_selects_its_group():
+    job = MonitoringJob({
+        "name": "Loans",
+        "cron": "0 9 * * *",
+        "investments": {"ids": [1, 2, 3], "types": ["senior secured loan"]}
+    })
+    investments = [
+        {"id": 1, "type": "Senior Secured Loan"},
+        {"id": 2, "type": "Mezzanine Debt"},
+        {"id": 4, "type": "Senior Secured Loan"}
+    ]
+
+    assert job.select(investments) == investments[:1]
+
+
+@pytest.mark.parametrize("config, message", [
+    ({"cron": "0 9 * * *"}, "missing 'name'"),
+    ({"name": "Job"}, "missing 'cron'"),
+    ({"name": "Job", "cron": "0 9 * * *", "overlap": "drop"}, "overlap"),
+    ({"name": "Job", "cron": "0 9 * * *", "investments": {"sectors": ["Retail"]}}, "sectors"),
+])
+def test_invalid_jobs(config, message):
+    with pytest.raises(ValueError, match=message):
+        MonitoringJob(config)
+
+
+def test_shipped_schedule_loads():
+    assert [job.name for job in load_schedule()] == ["Intraday Leveraged Loans", "Daily Full Portfolio"]
+
+
+def test_overlap_policies():
+    skip = MonitoringJob({"name": "skip", "cron": "* * * * *", "overlap": "skip"})
+    queue = MonitoringJob({"name": "queue", "cron": "* * * * *", "overlap": "queue"})
+    scheduler = MonitoringScheduler([skip, queue])
+
+    # Nothing running: both are accepted
+    assert scheduler.dispatch(skip)
+    scheduler.running = scheduler.pending.popleft()
+
+    # While a run is active, 'skip' drops and 'queue' waits once
+    assert not scheduler.dispatch(skip)
+    assert scheduler.dispatch(queue)
+    assert not scheduler.dispatch(queue)
+    assert list(scheduler.pending) == [queue]
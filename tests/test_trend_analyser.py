@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine import trend_analyser
+from engine.trend_analyser import analyze_trend, analyze_trends_batch
+
+RNG = np.random.default_rng(7)
+
+SERIES = {
+    # Rounded data landing exactly on the slope cut-off, both directions
+    "slope_at_cutoff_up": [round(1 + 0.001 * i, 3) for i in range(7)],
+    "slope_at_cutoff_down": [round(2 - 0.001 * i, 3) for i in range(7)],
+    "slope_just_inside": [round(1 + 0.0009 * i, 4) for i in range(7)],
+    # Alternating values whose std is exactly a confidence cut-off
+    "std_at_high_cutoff": [1.0, 1.04] * 3,
+    "std_at_medium_cutoff": [1.0, 1.1] * 3,
+    "flat": [3.5] * 7,
+    "starts_at_zero": [0.0, 0.5, 1.0, 1.5],
+    "too_short": [1.0, 2.0],
+    "longer_than_window": [round(x, 2) for x in RNG.normal(2, 0.5, 20)],
+    "with_nan": [1.0, np.nan, 1.2, 1.3],
+}
+
+# Plus rounded random walks, like real reported ratios
+for n in range(10):
+    SERIES[f"random_{n}"] = np.round(
+        RNG.normal(3, 1) + np.cumsum(RNG.normal(0, 0.01, 3 + n)), 2
+    ).tolist()
+
+
+@pytest.mark.parametrize("name", list(SERIES))
+def test_batch_matches_single_series(name):
+    df = pd.DataFrame({"Leverage": SERIES[name]})
+
+    batched = analyze_trends_batch([df], ["Leverage", "Missing"])[0]
+
+    assert batched["Leverage"] == analyze_trend(df, "Leverage")
+    assert batched["Missing"] == analyze_trend(df, "Missing")
+
+
+def test_batch_matches_single_series_across_frames():
+    frames = [pd.DataFrame({"A": values, "B": values[::-1]}) for values in SERIES.values()]
+
+    batched = analyze_trends_batch(frames, ["A", "B"], window=5)
+
+    for df, result in zip(frames, batched):
+        assert result == {m: analyze_trend(df, m, window=5) for m in ["A", "B"]}
+
+
+def test_cutoff_series_are_recomputed_exactly(monkeypatch):
+    calls = []
+    exact = trend_analyser._exact_near_cutoffs
+
+    def spy(values, slope, value_std):
+        result = exact(values, slope, value_std)
+        calls.append((slope, value_std) != result)
+        return result
+
+    monkeypatch.setattr(trend_analyser, "_exact_near_cutoffs", spy)
+    frames = [
+        pd.DataFrame({"A": SERIES[name]})
+        for name in ["slope_at_cutoff_up", "std_at_high_cutoff", "std_at_medium_cutoff"]
+    ]
+
+    analyze_trends_batch(frames, ["A"])
+
+    # The closed form is replaced by polyfit / np.std for at least one of them
+    assert len(calls) == 3 and any(calls)
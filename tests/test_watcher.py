@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+
+import pytest
+
+from engine.rule_engine import RULES_PATH
+from engine.watcher import PipelineWatcher
+
+
+@pytest.fixture
+def watcher(data_folder):
+    return PipelineWatcher(debounce=0.1, max_delay=0.5, polling=True)
+
+
+def _path(folder, name):
+    return os.path.realpath(folder / name)
+
+
+def test_notify_keeps_only_relevant_paths(watcher, data_folder, tmp_path_factory):
+    outside = tmp_path_factory.mktemp("outside") / "other.csv"
+
+    watcher.notify(data_folder / "metrics.csv")
+    watcher.notify(data_folder / "warehouse.db-wal")
+    watcher.notify(outside)
+    watcher.notify(RULES_PATH)
+
+    assert watcher.changes == {
+        _path(data_folder, "metrics.csv"),
+        _path(data_folder, "warehouse.db"),
+        os.path.realpath(RULES_PATH)
+    }
+
+
+def test_burst_of_writes_is_one_batch(watcher, data_folder):
+    def burst():
+        for i in range(5):
+            watcher.notify(data_folder / f"file{i % 2}.csv")
+            time.sleep(0.03)
+
+    thread = threading.Thread(target=burst)
+    started = time.monotonic()
+    thread.start()
+
+    batch = watcher._next_batch()
+    thread.join()
+
+    assert batch == {_path(data_folder, "file0.csv"), _path(data_folder, "file1.csv")}
+    # Settled only after the last write plus the debounce
+    assert time.monotonic() - started >= 0.12 + 0.1
+    assert not watcher.changed_event.is_set()
+
+
+def test_constant_writes_are_flushed_after_max_delay(watcher, data_folder):
+    stop = threading.Event()
+
+    def writer():
+        while not stop.wait(0.02):
+            watcher.notify(data_folder / "metrics.csv")
+
+    thread = threading.Thread(target=writer)
+    started = time.monotonic()
+    thread.start()
+
+    try:
+        batch = watcher._next_batch()
+    finally:
+        stop.set()
+        thread.join()
+
+    assert batch == {_path(data_folder, "metrics.csv")}
+    assert 0.5 <= time.monotonic() - started < 1.5
+
+
+def test_affected_investments(watcher, data_folder):
+    investments = [
+        {"id": 1, "data_source": {"type": "csv", "path": "metrics.csv"}},
+        {"id": 2, "data_source": {"type": "sqlite", "path": "warehouse.db", "table": "metrics"}},
+        {"id": 3, "data_source": {"type": "api", "url": "https://api.test"}}
+    ]
+
+    changed = {_path(data_folder, "warehouse.db")}
+    assert watcher.affected_investments(investments, changed) == {"2"}
+    assert watcher.affected_investments(investments, {_path(data_folder, "other.csv")}) == set()
+
+    # Config changes are left to the incremental fingerprints
+    assert watcher.affected_investments(investments, changed | {os.path.realpath(RULES_PATH)}) is None